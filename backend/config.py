@@ -32,37 +32,62 @@ class Settings(BaseSettings):
     OLLAMA_BASE_URL: str = "http://localhost:11434"
     OLLAMA_MODEL: str = "llama3.2:latest"  # Default model, will auto-fallback to first available generative model
     OLLAMA_TIMEOUT: int = 480  # 8 minutes per receipt (increased for international receipts with complex VAT calculations)
+    OLLAMA_CHECK_TTL_SECS: int = 30  # Reuse the last /api/tags connection check for this long
     
     # Processing Settings
     MAX_FILE_SIZE_MB: int = 50
     SUPPORTED_IMAGE_FORMATS: list = [".png", ".jpg", ".jpeg"]
     
+    # PDF Rendering (scanned pages rendered to images for OCR)
+    PDF_RENDER_DPI: int = 200             # 200 is enough for receipt OCR; 300 costs ~2.25x the pixels
+    PDF_RENDER_FORMAT: str = "png"        # "png" (lossless, fast compress level) or "jpg" (quality 92)
+    PDF_RENDER_GRAYSCALE: bool = True     # Single-channel bitmaps: 1/3 the bytes, and OCR binarizes anyway
+
     # Receipt Detection Mode
     # Single-receipt-per-page: skip contour detection, OCR the full page image directly.
     # Set to False to re-enable legacy multi-receipt contour detection.
     SINGLE_RECEIPT_PER_PAGE: bool = True
+    PAGE_CONCURRENCY: int = 4   # Pages OCR'd/extracted in parallel (match OLLAMA_NUM_PARALLEL)
+    PAGE_BATCH_SIZE: int = 10   # Pages submitted per batch; bounds rendered pages held in memory
     
     # OCR Settings
     OCR_LANG: str = "en"  # For PaddleOCR: "en", "ch", "fr", "german", "korean", "japan", etc.
 
     # RAG / Embedding Settings
     EMBEDDING_MODEL: str = "nomic-embed-text"
+    EMBED_BATCH_SIZE: int = 64        # Max texts per /api/embed request (stay under Ollama's n_batch)
+    EMBED_MAX_CONCURRENCY: int = 4    # Max /api/embed batch requests in flight at once
+    EMBED_CACHE_SIZE: int = 2048      # In-memory LRU of embeddings keyed by text hash (0 disables)
     CHROMA_PERSIST_DIR: Path = BASE_DIR / "vector_store"
     CHROMA_COLLECTION_NAME: str = "receipt_embeddings"
     RAG_TOP_K: int = 3               # Number of similar receipts to retrieve
     RAG_MIN_SIMILARITY: float = 0.55  # Minimum cosine similarity to consider a match
+    RAG_INDEX_BATCH_SIZE: int = 128   # Receipts per Chroma upsert when bulk indexing
+    RAG_CACHE_SIZE: int = 256         # Recent RAG queries kept in the semantic cache (0 disables)
+    RAG_CACHE_TAU: float = 0.95       # Cosine similarity at which a cached query's matches are reused
+    RAG_QUANTIZE: bool = True         # Keep semantic-cache embeddings as int8 instead of float32
     RAG_ENABLED: bool = True          # Toggle RAG pipeline on/off
+    RAG_SPECULATIVE_EXTRACTION: bool = False  # Run the LLM without few-shot examples while RAG retrieval
+                                              # runs in parallel; matches are used for cross-validation only
+    CACHE_DIR: Path = Path.home() / ".cache" / "receipt-genie"
+    MODEL_VERIFY_TTL_SECS: int = 86400  # Trust a previous embedding-model check for this long
 
     class Config:
         env_file = ".env"
         case_sensitive = True
 
 
+def _ensure_dir(path: Path) -> None:
+    """Create a directory if missing (a single stat when it already exists)."""
+    if not path.is_dir():
+        path.mkdir(parents=True, exist_ok=True)
+
+
 # Initialize settings
 settings = Settings()
 
 # Ensure directories exist
-settings.TEMP_DIR.mkdir(parents=True, exist_ok=True)
-settings.EXPORTS_DIR.mkdir(parents=True, exist_ok=True)
-settings.CHROMA_PERSIST_DIR.mkdir(parents=True, exist_ok=True)
+_ensure_dir(settings.TEMP_DIR)
+_ensure_dir(settings.EXPORTS_DIR)
+_ensure_dir(settings.CHROMA_PERSIST_DIR)
 
@@ -1,7 +1,7 @@
 """
 Database configuration and session management.
 """
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from config import settings
@@ -17,6 +17,15 @@ if settings.DATABASE_URL.startswith("sqlite"):
         echo=settings.DATABASE_ECHO,
         connect_args={"check_same_thread": False}  # Required for SQLite
     )
+
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        # WAL + synchronous=NORMAL: commits no longer fsync the main database
+        # file each time, and readers don't block the pipeline's writes.
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
 else:
     # MySQL/PostgreSQL configuration
     engine = create_engine(
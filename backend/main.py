@@ -22,6 +22,7 @@ if str(backend_dir) not in sys.path:
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
 from contextlib import asynccontextmanager
 
 from config import settings
@@ -71,11 +72,15 @@ async def lifespan(app: FastAPI):
 
     # Initialise RAG / vector store
     if settings.RAG_ENABLED:
-        from services.embedding_service import verify_embedding_model
+        from services.embedding_service import verify_embedding_model, warm_up_embedding_model
         from services.vector_store import init_vector_store
 
-        if verify_embedding_model():
+        # Blocking HTTP (possibly an /api/pull) runs off the event loop
+        if await run_in_threadpool(verify_embedding_model):
             logger.info(f"[OK] Embedding model '{settings.EMBEDDING_MODEL}' is available")
+            # Load the model into Ollama's memory so the first upload doesn't pay for it
+            if await run_in_threadpool(warm_up_embedding_model):
+                logger.info("[OK] Embedding model warmed up")
         else:
             logger.warning(f"[WARNING] Embedding model '{settings.EMBEDDING_MODEL}' not available — RAG will be disabled at runtime")
 
@@ -0,0 +1,115 @@
+"""
+Migration script to add currency and vat_percentage columns to receipts table.
+
+Both values used to live only inside the ``_metadata`` block of the ``items``
+JSON. The script adds the columns and backfills them from that JSON once, so
+read paths no longer have to parse ``items`` to get them.
+
+Run this script once to update your existing database schema:
+    python -m migrations.add_currency_columns
+"""
+import sys
+import json
+from pathlib import Path
+
+# Add backend directory to path
+backend_dir = Path(__file__).parent.parent
+if str(backend_dir) not in sys.path:
+    sys.path.insert(0, str(backend_dir))
+
+from sqlalchemy import text, inspect
+from database import engine, test_connection
+import logging
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def column_exists(conn, table_name: str, column_name: str) -> bool:
+    """Check if a column exists in a table."""
+    inspector = inspect(engine)
+    columns = [col['name'] for col in inspector.get_columns(table_name)]
+    return column_name in columns
+
+
+def backfill_from_items(conn) -> int:
+    """Copy currency / vat_percentage out of the items JSON metadata."""
+    rows = conn.execute(text(
+        "SELECT id, items FROM receipts "
+        "WHERE items IS NOT NULL AND currency IS NULL AND vat_percentage IS NULL"
+    )).fetchall()
+
+    updated = 0
+    for receipt_id, items in rows:
+        try:
+            items_data = json.loads(items)
+        except (TypeError, ValueError):
+            continue
+        metadata = items_data.get("_metadata", {}) if isinstance(items_data, dict) else {}
+        currency = metadata.get("currency")
+        vat_percentage = metadata.get("vat_percentage")
+        if currency is None and vat_percentage is None:
+            continue
+        conn.execute(
+            text("UPDATE receipts SET currency = :currency, vat_percentage = :vat WHERE id = :id"),
+            {"currency": currency, "vat": vat_percentage, "id": receipt_id},
+        )
+        updated += 1
+
+    conn.commit()
+    return updated
+
+
+def migrate():
+    """Add currency/vat_percentage columns to receipts table and backfill them."""
+    if not test_connection():
+        logger.error("Database connection failed. Cannot run migration.")
+        return False
+
+    try:
+        with engine.connect() as conn:
+            if not column_exists(conn, 'receipts', 'currency'):
+                logger.info("Adding 'currency' column...")
+                conn.execute(text("ALTER TABLE receipts ADD COLUMN currency VARCHAR(8)"))
+                conn.commit()
+                logger.info("✓ Added 'currency' column")
+            else:
+                logger.info("✓ Column 'currency' already exists")
+
+            if not column_exists(conn, 'receipts', 'vat_percentage'):
+                logger.info("Adding 'vat_percentage' column...")
+                conn.execute(text("ALTER TABLE receipts ADD COLUMN vat_percentage FLOAT"))
+                conn.commit()
+                logger.info("✓ Added 'vat_percentage' column")
+            else:
+                logger.info("✓ Column 'vat_percentage' already exists")
+
+            updated = backfill_from_items(conn)
+            logger.info(f"✓ Backfilled currency/vat_percentage for {updated} receipt(s)")
+
+            logger.info("✓ Migration completed successfully!")
+            return True
+
+    except Exception as e:
+        logger.error(f"✗ Migration failed: {str(e)}")
+        logger.exception("Full error traceback:")
+        return False
+
+
+if __name__ == "__main__":
+    logger.info("=" * 60)
+    logger.info("Database Migration: Add Currency Columns")
+    logger.info("=" * 60)
+
+    success = migrate()
+
+    if success:
+        logger.info("=" * 60)
+        logger.info("Migration completed successfully!")
+        logger.info("=" * 60)
+        sys.exit(0)
+    else:
+        logger.error("=" * 60)
+        logger.error("Migration failed!")
+        logger.error("=" * 60)
+        sys.exit(1)
@@ -0,0 +1,77 @@
+"""
+Migration script to add the (file_id, receipt_number) index to receipts table.
+
+The receipts endpoints fetch every receipt of a file ordered by receipt
+number; with this index that is a B-tree range scan instead of a full scan
+plus sort.
+
+Run this script once to update your existing database schema:
+    python -m migrations.add_receipt_file_order_index
+"""
+import sys
+from pathlib import Path
+
+# Add backend directory to path
+backend_dir = Path(__file__).parent.parent
+if str(backend_dir) not in sys.path:
+    sys.path.insert(0, str(backend_dir))
+
+from sqlalchemy import text, inspect
+from database import engine, test_connection
+import logging
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+INDEX_NAME = "ix_receipt_file_order"
+
+
+def index_exists(table_name: str, index_name: str) -> bool:
+    """Check if an index exists on a table."""
+    inspector = inspect(engine)
+    return any(ix['name'] == index_name for ix in inspector.get_indexes(table_name))
+
+
+def migrate():
+    """Create the receipts (file_id, receipt_number) index if it doesn't exist."""
+    if not test_connection():
+        logger.error("Database connection failed. Cannot run migration.")
+        return False
+
+    try:
+        if index_exists('receipts', INDEX_NAME):
+            logger.info(f"✓ Index '{INDEX_NAME}' already exists. Migration not needed.")
+            return True
+
+        with engine.connect() as conn:
+            logger.info(f"Creating index '{INDEX_NAME}'...")
+            conn.execute(text(f"CREATE INDEX {INDEX_NAME} ON receipts (file_id, receipt_number)"))
+            conn.commit()
+            logger.info(f"✓ Created index '{INDEX_NAME}'")
+
+            logger.info("✓ Migration completed successfully!")
+            return True
+
+    except Exception as e:
+        logger.error(f"✗ Migration failed: {str(e)}")
+        logger.exception("Full error traceback:")
+        return False
+
+
+if __name__ == "__main__":
+    logger.info("=" * 60)
+    logger.info("Database Migration: Add Receipt File/Order Index")
+    logger.info("=" * 60)
+
+    success = migrate()
+
+    if success:
+        logger.info("=" * 60)
+        logger.info("Migration completed successfully!")
+        logger.info("=" * 60)
+        sys.exit(0)
+    else:
+        logger.error("=" * 60)
+        logger.error("Migration failed!")
+        logger.error("=" * 60)
+        sys.exit(1)
@@ -0,0 +1,115 @@
+"""
+Migration script to store receipts.raw_text zlib-compressed.
+
+On MySQL/PostgreSQL the column is converted to a binary type first. On
+every backend, rows still holding plain text are compressed. SQLite reads
+legacy plain-text rows transparently, so running this there only reclaims
+the space.
+
+Run this script once to update your existing database schema:
+    python -m migrations.compress_raw_text
+"""
+import sys
+import zlib
+from pathlib import Path
+
+# Add backend directory to path
+backend_dir = Path(__file__).parent.parent
+if str(backend_dir) not in sys.path:
+    sys.path.insert(0, str(backend_dir))
+
+from sqlalchemy import text
+from database import engine, test_connection
+from config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def _is_compressed(value) -> bool:
+    """True if value is already a zlib stream (plain text never decompresses)."""
+    if isinstance(value, str):
+        return False
+    try:
+        zlib.decompress(value)
+        return True
+    except zlib.error:
+        return False
+
+
+def convert_column_type(conn) -> None:
+    """Switch the raw_text column to a binary type (no-op on SQLite)."""
+    url = settings.DATABASE_URL
+    if url.startswith("sqlite"):
+        return
+    if url.startswith("mysql"):
+        logger.info("Converting 'raw_text' column to LONGBLOB...")
+        conn.execute(text("ALTER TABLE receipts MODIFY raw_text LONGBLOB NULL"))
+    elif url.startswith("postgresql"):
+        logger.info("Converting 'raw_text' column to BYTEA...")
+        conn.execute(text(
+            "ALTER TABLE receipts ALTER COLUMN raw_text TYPE BYTEA "
+            "USING convert_to(raw_text, 'UTF8')"
+        ))
+    conn.commit()
+
+
+def compress_rows(conn) -> int:
+    """Compress plain-text rows."""
+    rows = conn.execute(text("SELECT id, raw_text FROM receipts WHERE raw_text IS NOT NULL")).fetchall()
+
+    converted = 0
+    for receipt_id, raw_text in rows:
+        if _is_compressed(raw_text):
+            continue
+        if not isinstance(raw_text, str):
+            raw_text = bytes(raw_text).decode("utf-8")
+        conn.execute(
+            text("UPDATE receipts SET raw_text = :raw_text WHERE id = :id"),
+            {"raw_text": zlib.compress(raw_text.encode("utf-8"), 6), "id": receipt_id},
+        )
+        converted += 1
+
+    conn.commit()
+    return converted
+
+
+def migrate():
+    """Compress receipts.raw_text."""
+    if not test_connection():
+        logger.error("Database connection failed. Cannot run migration.")
+        return False
+
+    try:
+        with engine.connect() as conn:
+            convert_column_type(conn)
+            converted = compress_rows(conn)
+            logger.info(f"✓ Compressed raw_text of {converted} receipt(s)")
+
+            logger.info("✓ Migration completed successfully!")
+            return True
+
+    except Exception as e:
+        logger.error(f"✗ Migration failed: {str(e)}")
+        logger.exception("Full error traceback:")
+        return False
+
+
+if __name__ == "__main__":
+    logger.info("=" * 60)
+    logger.info("Database Migration: Compress Raw Text")
+    logger.info("=" * 60)
+
+    success = migrate()
+
+    if success:
+        logger.info("=" * 60)
+        logger.info("Migration completed successfully!")
+        logger.info("=" * 60)
+        sys.exit(0)
+    else:
+        logger.error("=" * 60)
+        logger.error("Migration failed!")
+        logger.error("=" * 60)
+        sys.exit(1)
@@ -0,0 +1,115 @@
+"""
+Migration script to store receipts.items as CBOR instead of JSON text.
+
+On MySQL/PostgreSQL the column is converted to a binary type first. On
+every backend, rows still holding JSON text are re-encoded as CBOR. SQLite
+reads legacy JSON rows transparently, so running this there only reclaims
+the space.
+
+Run this script once to update your existing database schema:
+    python -m migrations.convert_items_to_cbor
+"""
+import sys
+import json
+from pathlib import Path
+
+# Add backend directory to path
+backend_dir = Path(__file__).parent.parent
+if str(backend_dir) not in sys.path:
+    sys.path.insert(0, str(backend_dir))
+
+import cbor2
+from sqlalchemy import text
+from database import engine, test_connection
+from config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def _is_json_text(value) -> bool:
+    """JSON documents start with '{' or '['; CBOR maps/arrays never do."""
+    if isinstance(value, str):
+        return True
+    return bool(value) and value[:1] in (b"{", b"[")
+
+
+def convert_column_type(conn) -> None:
+    """Switch the items column to a binary type (no-op on SQLite)."""
+    url = settings.DATABASE_URL
+    if url.startswith("sqlite"):
+        return
+    if url.startswith("mysql"):
+        logger.info("Converting 'items' column to LONGBLOB...")
+        conn.execute(text("ALTER TABLE receipts MODIFY items LONGBLOB NULL"))
+    elif url.startswith("postgresql"):
+        logger.info("Converting 'items' column to BYTEA...")
+        conn.execute(text(
+            "ALTER TABLE receipts ALTER COLUMN items TYPE BYTEA "
+            "USING convert_to(items, 'UTF8')"
+        ))
+    conn.commit()
+
+
+def reencode_rows(conn) -> int:
+    """Re-encode JSON text rows as CBOR."""
+    rows = conn.execute(text("SELECT id, items FROM receipts WHERE items IS NOT NULL")).fetchall()
+
+    converted = 0
+    for receipt_id, items in rows:
+        if not _is_json_text(items):
+            continue
+        try:
+            items_data = json.loads(items)
+        except (TypeError, ValueError):
+            logger.warning(f"Skipping receipt {receipt_id}: items is not valid JSON")
+            continue
+        conn.execute(
+            text("UPDATE receipts SET items = :items WHERE id = :id"),
+            {"items": cbor2.dumps(items_data), "id": receipt_id},
+        )
+        converted += 1
+
+    conn.commit()
+    return converted
+
+
+def migrate():
+    """Convert receipts.items to CBOR."""
+    if not test_connection():
+        logger.error("Database connection failed. Cannot run migration.")
+        return False
+
+    try:
+        with engine.connect() as conn:
+            convert_column_type(conn)
+            converted = reencode_rows(conn)
+            logger.info(f"✓ Re-encoded {converted} receipt(s) as CBOR")
+
+            logger.info("✓ Migration completed successfully!")
+            return True
+
+    except Exception as e:
+        logger.error(f"✗ Migration failed: {str(e)}")
+        logger.exception("Full error traceback:")
+        return False
+
+
+if __name__ == "__main__":
+    logger.info("=" * 60)
+    logger.info("Database Migration: Convert Items to CBOR")
+    logger.info("=" * 60)
+
+    success = migrate()
+
+    if success:
+        logger.info("=" * 60)
+        logger.info("Migration completed successfully!")
+        logger.info("=" * 60)
+        sys.exit(0)
+    else:
+        logger.error("=" * 60)
+        logger.error("Migration failed!")
+        logger.error("=" * 60)
+        sys.exit(1)
@@ -1,12 +1,69 @@
 """
 SQLAlchemy database models.
 """
-from sqlalchemy import Column, Integer, String, Float, DateTime, Text, ForeignKey, JSON
+import json
+import zlib
+
+import cbor2
+from sqlalchemy import Column, Integer, String, Float, DateTime, Text, ForeignKey, JSON, LargeBinary, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
+from sqlalchemy.types import TypeDecorator
 from database import Base
 
 
+class CBORDocument(TypeDecorator):
+    """
+    Binary column holding a CBOR-encoded Python value (dict/list).
+
+    CBOR is noticeably more compact than the JSON text it replaces. Rows
+    written before the switch still contain JSON text; those are decoded
+    with ``json.loads`` so no rewrite is needed on SQLite.
+    """
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return cbor2.dumps(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, str):
+            return json.loads(value)
+        return cbor2.loads(value)
+
+
+class CompressedText(TypeDecorator):
+    """
+    Binary column holding zlib-compressed UTF-8 text.
+
+    OCR text is highly repetitive and compresses several times over. Rows
+    written before the switch still contain plain text (a str on SQLite, the
+    raw UTF-8 bytes after a TEXT -> BYTEA conversion); those are returned
+    as-is.
+    """
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return zlib.compress(value.encode("utf-8"), 6)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, str):
+            return value
+        try:
+            return zlib.decompress(value).decode("utf-8")
+        except zlib.error:
+            return bytes(value).decode("utf-8")
+
+
 class UploadedFile(Base):
     """Model for uploaded PDF files."""
     __tablename__ = "uploaded_files"
@@ -26,6 +83,10 @@ class UploadedFile(Base):
 class Receipt(Base):
     """Model for extracted receipt data."""
     __tablename__ = "receipts"
+    __table_args__ = (
+        # Serves "receipts of a file, in order" without a filesort
+        Index("ix_receipt_file_order", "file_id", "receipt_number"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     file_id = Column(String(255), ForeignKey("uploaded_files.file_id"), nullable=False)
@@ -37,14 +98,16 @@ class Receipt(Base):
     total_amount = Column(Float, nullable=True)
     tax_amount = Column(Float, nullable=True)
     subtotal = Column(Float, nullable=True)
-    items = Column(Text, nullable=True)  # JSON string of items
+    items = Column(CBORDocument, nullable=True)  # {"items": [...], "_metadata": {...}}
     # JSON type works with both SQLite (stored as TEXT) and MySQL/PostgreSQL
     vat_breakdown = Column(JSON, nullable=True)  # JSON array of VAT breakdown entries
     vat_percentage_effective = Column(Float, nullable=True)  # Weighted effective VAT percentage
+    currency = Column(String(8), nullable=True)  # ISO currency code (EUR, USD, ...)
+    vat_percentage = Column(Float, nullable=True)  # User-set or effective VAT percentage
     payment_method = Column(String(100), nullable=True)
     address = Column(String(500), nullable=True)
     phone = Column(String(50), nullable=True)
-    raw_text = Column(Text, nullable=True)  # Full OCR text
+    raw_text = Column(CompressedText, nullable=True)  # Full OCR text (zlib)
     is_credit = Column(Integer, default=0, nullable=False)  # 0=normal, 1=credit/return
     items_verified = Column(Integer, nullable=True)  # None=unknown, 0=false, 1=true
     
@@ -17,7 +17,7 @@ router = APIRouter(prefix="/export", tags=["Export"])
 
 
 @router.get("/csv")
-async def export_csv(
+def export_csv(
     file_id: str,
     db: Session = Depends(get_db)
 ):
@@ -44,14 +44,12 @@ async def export_csv(
     # Prepare data for DataFrame
     data = []
     for receipt in receipts:
-        # Items + metadata are stored as JSON in the items column
-        items_raw = json.loads(receipt.items) if receipt.items else {}
+        # Items + metadata are stored together in the items column
+        items_raw = receipt.items or {}
         if isinstance(items_raw, dict):
             items_list = items_raw.get("items", [])
-            metadata = items_raw.get("_metadata", {})
         else:
             items_list = items_raw if isinstance(items_raw, list) else []
-            metadata = {}
 
         # Human‑readable items string
         def format_item(item: dict) -> str:
@@ -65,10 +63,9 @@ async def export_csv(
         # VAT % – prefer effective percentage when available
         vat_percentage = receipt.vat_percentage_effective
         if vat_percentage is None:
-            vat_percentage = metadata.get("vat_percentage")
+            vat_percentage = receipt.vat_percentage
 
-        # Currency from metadata if present
-        currency = metadata.get("currency")
+        currency = receipt.currency
 
         # Optional VAT breakdown string for richer exports
         vat_breakdown_str = ""
@@ -130,7 +127,7 @@ async def export_csv(
 
 
 @router.get("/excel")
-async def export_excel(
+def export_excel(
     file_id: str,
     db: Session = Depends(get_db)
 ):
@@ -157,13 +154,11 @@ async def export_excel(
     # Prepare data for DataFrame (same structure as CSV export)
     data = []
     for receipt in receipts:
-        items_raw = json.loads(receipt.items) if receipt.items else {}
+        items_raw = receipt.items or {}
         if isinstance(items_raw, dict):
             items_list = items_raw.get("items", [])
-            metadata = items_raw.get("_metadata", {})
         else:
             items_list = items_raw if isinstance(items_raw, list) else []
-            metadata = {}
 
         def format_item(item: dict) -> str:
             name = item.get("name", "") or ""
@@ -174,9 +169,9 @@ async def export_excel(
 
         vat_percentage = receipt.vat_percentage_effective
         if vat_percentage is None:
-            vat_percentage = metadata.get("vat_percentage")
+            vat_percentage = receipt.vat_percentage
 
-        currency = metadata.get("currency")
+        currency = receipt.currency
 
         vat_breakdown_str = ""
         if receipt.vat_breakdown:
@@ -1,31 +1,52 @@
 """
 Receipt processing endpoints.
 """
-from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks, Response
+from pydantic import TypeAdapter
+from sqlalchemy import case, func
 from sqlalchemy.orm import Session
+from datetime import datetime, timezone
 from typing import List
 import uuid
 
-from database import get_db
+from config import settings
+from database import get_db, SessionLocal
 from models.db_models import UploadedFile, Receipt, ProcessingJob
 from models.receipt import (
-    ProcessResponse, JobStatusResponse, ReceiptListResponse, ReceiptResponse,
-    EnhancedReceiptListResponse, PageStat, ReceiptUpdate
+    ProcessResponse, JobStatusResponse, ReceiptResponse,
+    EnhancedReceiptListResponse, ReceiptUpdate
 )
-from services.pipeline import process_pdf_pipeline
+from services.pipeline import process_pdf_pipeline, normalize_extracted_fields
+from services.llm_extractor import reconcile_vat_and_items
 from services.vector_store import index_receipt as vs_index_receipt, get_store_stats
 from utils.responses import success_response, error_response
-import json
 import logging
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/process", tags=["Process"])
 
+# Handlers below only do blocking work (sync SQLAlchemy, Chroma, Ollama), so
+# they are plain ``def``: Starlette runs them in its threadpool instead of
+# stalling the event loop for every other request.
+
 
 # In-memory job status (in production, use Redis or database)
 _job_status = {}
 
+# Built once: the schema for the receipts listing is compiled at import time
+_RECEIPT_LIST_ADAPTER = TypeAdapter(EnhancedReceiptListResponse)
+
+
+def _utcnow() -> datetime:
+    """Naive UTC, the same form the DB returns for ProcessingJob timestamps."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _count_null(column):
+    """SQL expression counting rows where ``column`` IS NULL (0 on empty sets)."""
+    return func.coalesce(func.sum(case((column.is_(None), 1), else_=0)), 0)
+
 
 def update_job_status(job_id: str, status: str, progress: int, error_message: str = None):
     """Update job status in memory."""
@@ -34,15 +55,25 @@ def update_job_status(job_id: str, status: str, progress: int, error_message: st
         _job_status[job_id]["progress"] = progress
         if error_message:
             _job_status[job_id]["error_message"] = error_message
+        if status in ("completed", "failed"):
+            _job_status[job_id]["completed_at"] = _utcnow()
 
 
 def process_pdf_background(
     job_id: str,
-    file_id: str,
-    db: Session
+    file_id: str
 ):
-    """Background task for processing PDF."""
+    """
+    Background task for processing PDF.
+
+    Runs on its own session: it records the ProcessingJob row itself, so the
+    request that enqueued it never waits on a commit.
+    """
+    db = SessionLocal()
     try:
+        db.add(ProcessingJob(job_id=job_id, file_id=file_id, status="pending"))
+        db.commit()
+
         update_job_status(job_id, "processing", 0)
 
         def progress_callback(progress: int, message: str):
@@ -81,10 +112,12 @@ def process_pdf_background(
         logger.error(f"[{job_id}] Pipeline failed: {str(e)}")
         logger.exception("Full error traceback:")
         update_job_status(job_id, "failed", 0, str(e))
+    finally:
+        db.close()
 
 
 @router.post("/pdf", response_model=ProcessResponse)
-async def process_pdf(
+def process_pdf(
     file_id: str,
     background_tasks: BackgroundTasks,
     db: Session = Depends(get_db)
@@ -103,26 +136,19 @@ async def process_pdf(
     # Generate job ID
     job_id = str(uuid.uuid4())
     
-    # Create job record
-    job = ProcessingJob(
-        job_id=job_id,
-        file_id=file_id,
-        status="pending"
-    )
-    db.add(job)
-    db.commit()
-    
     # Initialize job status
     _job_status[job_id] = {
         "job_id": job_id,
         "file_id": file_id,
         "status": "pending",
         "progress": 0,
-        "error_message": None
+        "error_message": None,
+        "created_at": _utcnow(),
+        "completed_at": None,
     }
     
-    # Add background task
-    background_tasks.add_task(process_pdf_background, job_id, file_id, db)
+    # Add background task (it creates the job record on its own session)
+    background_tasks.add_task(process_pdf_background, job_id, file_id)
     
     return ProcessResponse(
         job_id=job_id,
@@ -133,7 +159,7 @@ async def process_pdf(
 
 
 @router.get("/status/{job_id}", response_model=JobStatusResponse)
-async def get_job_status(
+def get_job_status(
     job_id: str,
     db: Session = Depends(get_db)
 ):
@@ -155,8 +181,8 @@ async def get_job_status(
             completed_at=job.completed_at
         )
     
+    # Timestamps are tracked in memory too, so polling never touches the DB
     status_data = _job_status[job_id]
-    job = db.query(ProcessingJob).filter(ProcessingJob.job_id == job_id).first()
     
     return JobStatusResponse(
         job_id=status_data["job_id"],
@@ -164,17 +190,23 @@ async def get_job_status(
         status=status_data["status"],
         progress=status_data["progress"],
         error_message=status_data.get("error_message"),
-        created_at=job.created_at if job else None,
-        completed_at=job.completed_at if job else None
+        created_at=status_data["created_at"],
+        completed_at=status_data.get("completed_at")
     )
 
 
 @router.get("/receipts/{file_id}", response_model=EnhancedReceiptListResponse)
-async def get_receipts(
+def get_receipts(
     file_id: str,
     db: Session = Depends(get_db)
 ):
-    """Get all extracted receipts for a file with enhanced stats."""
+    """
+    Get all extracted receipts for a file with enhanced stats.
+
+    Rows are collected as plain dicts, validated once through a prebuilt
+    TypeAdapter and serialized straight to JSON bytes, skipping FastAPI's
+    second response_model validation and jsonable_encoder pass.
+    """
     # Verify file exists
     uploaded_file = db.query(UploadedFile).filter(UploadedFile.file_id == file_id).first()
     if not uploaded_file:
@@ -185,12 +217,12 @@ async def get_receipts(
     
     receipt_list = []
     for receipt in receipts:
-        items_data = json.loads(receipt.items) if receipt.items else {}
+        items_data = receipt.items or {}
         # Extract metadata if stored in items JSON
         metadata = items_data.get("_metadata", {}) if isinstance(items_data, dict) else {}
         items = items_data if isinstance(items_data, list) else (items_data.get("items", []) if isinstance(items_data, dict) else [])
         
-        receipt_list.append(ReceiptResponse(
+        receipt_list.append(dict(
             id=receipt.id,
             file_id=receipt.file_id,
             receipt_number=receipt.receipt_number,
@@ -209,8 +241,8 @@ async def get_receipts(
             image_path=receipt.image_path,
             confidence_score=receipt.confidence_score,
             extraction_date=receipt.extraction_date,
-            currency=metadata.get("currency"),
-            vat_percentage=receipt.vat_percentage_effective or metadata.get("vat_percentage"),
+            currency=receipt.currency,
+            vat_percentage=receipt.vat_percentage_effective or receipt.vat_percentage,
             items_verified=bool(receipt.items_verified) if receipt.items_verified is not None else metadata.get("items_verified"),
             warnings=metadata.get("warnings", []),
             missing_fields=metadata.get("missing_fields")
@@ -233,7 +265,7 @@ async def get_receipts(
         detection_warning = pipeline_stats["detection_warning"]
 
         page_stats = [
-            PageStat(
+            dict(
                 page_number=ps.get("page_number", i + 1),
                 detected=ps.get("detected", 0),
                 successful=ps.get("successful", 0),
@@ -248,7 +280,7 @@ async def get_receipts(
         missing_estimate = 0
         detection_warning = receipts_extracted == 0
         page_stats = [
-            PageStat(
+            dict(
                 page_number=1,
                 detected=receipts_extracted,
                 successful=receipts_extracted,
@@ -257,7 +289,7 @@ async def get_receipts(
             )
         ]
 
-    return EnhancedReceiptListResponse(
+    response = _RECEIPT_LIST_ADAPTER.validate_python(dict(
         file_id=file_id,
         pages_processed=pages_processed,
         receipts_detected=receipts_detected,
@@ -266,11 +298,12 @@ async def get_receipts(
         page_stats=page_stats,
         detection_warning=detection_warning,
         receipts=receipt_list,
-    )
+    ))
+    return Response(content=_RECEIPT_LIST_ADAPTER.dump_json(response), media_type="application/json")
 
 
 @router.patch("/receipt/{receipt_id}", response_model=ReceiptResponse)
-async def update_receipt(
+def update_receipt(
     receipt_id: int,
     receipt_update: ReceiptUpdate,
     db: Session = Depends(get_db)
@@ -281,10 +314,6 @@ async def update_receipt(
     if not receipt:
         raise HTTPException(status_code=404, detail="Receipt not found")
     
-    # Import functions
-    from services.pipeline import normalize_extracted_fields
-    from services.llm_extractor import reconcile_vat_and_items
-    
     # Build update dict
     update_data = receipt_update.model_dump(exclude_unset=True)
     
@@ -297,22 +326,25 @@ async def update_receipt(
     # Check if we need to re-run reconciliation
     needs_reconciliation = items_update is not None or vat_breakdown_update is not None
     
-    # Normalize basic fields
+    # Normalize basic fields (normalization also fills in derived keys such as
+    # a default currency, in place; only write back the fields the client sent)
     if update_data:
-        normalized = normalize_extracted_fields(update_data)
-        for key, value in normalized.items():
+        sent_keys = list(update_data)
+        normalize_extracted_fields(update_data)
+        for key in sent_keys:
+            value = update_data.get(key)
             if value is not None:
                 setattr(receipt, key, value)
     
     # Handle items update
     if items_update is not None:
-        # Update items JSON
-        items_data = json.loads(receipt.items) if receipt.items else {}
+        # Assign a new dict: in-place mutation of the loaded value is not
+        # tracked by the ORM and would never be flushed
+        items_data = receipt.items or {}
         if not isinstance(items_data, dict):
             items_data = {"items": items_data if isinstance(items_data, list) else []}
         
-        items_data["items"] = items_update
-        receipt.items = json.dumps(items_data)
+        receipt.items = {**items_data, "items": items_update}
     
     # Handle VAT breakdown update
     if vat_breakdown_update is not None:
@@ -327,8 +359,8 @@ async def update_receipt(
             "total_amount": receipt.total_amount,
             "tax_amount": receipt.tax_amount,
             "subtotal": receipt.subtotal,
-            "currency": currency_update or (json.loads(receipt.items) if receipt.items else {}).get("_metadata", {}).get("currency"),
-            "items": items_update if items_update is not None else (json.loads(receipt.items) if receipt.items else {}).get("items", []),
+            "currency": currency_update or receipt.currency,
+            "items": items_update if items_update is not None else (receipt.items or {}).get("items", []),
             "vat_breakdown": vat_breakdown_update if vat_breakdown_update is not None else receipt.vat_breakdown,
             "payment_method": receipt.payment_method,
             "address": receipt.address,
@@ -350,24 +382,19 @@ async def update_receipt(
         if reconciled.get("subtotal") is not None:
             receipt.subtotal = reconciled["subtotal"]
     
-    # Update currency and vat_percentage in items metadata
-    items_data = json.loads(receipt.items) if receipt.items else {}
-    if not isinstance(items_data, dict):
-        items_data = {"items": items_data if isinstance(items_data, list) else []}
-    
-    if "_metadata" not in items_data:
-        items_data["_metadata"] = {}
-    
+    # Update currency and vat_percentage columns
     if currency_update is not None:
-        items_data["_metadata"]["currency"] = currency_update
+        receipt.currency = currency_update
     if vat_percentage_update is not None:
         # Round VAT percentage to 1 decimal
-        items_data["_metadata"]["vat_percentage"] = round(float(vat_percentage_update), 1)
+        receipt.vat_percentage = round(float(vat_percentage_update), 1)
     elif receipt.vat_percentage_effective is not None:
         # Use effective VAT if no explicit update
-        items_data["_metadata"]["vat_percentage"] = receipt.vat_percentage_effective
+        receipt.vat_percentage = receipt.vat_percentage_effective
     
-    receipt.items = json.dumps(items_data)
+    items_data = receipt.items or {}
+    if not isinstance(items_data, dict):
+        items_data = {"items": items_data if isinstance(items_data, list) else []}
     
     db.commit()
     db.refresh(receipt)
@@ -375,7 +402,6 @@ async def update_receipt(
     # Re-index the user-corrected receipt so it becomes a high-quality
     # few-shot example for future RAG retrievals (feedback loop).
     try:
-        from config import settings
         if settings.RAG_ENABLED:
             corrected_fields = {
                 "merchant_name": receipt.merchant_name,
@@ -383,7 +409,7 @@ async def update_receipt(
                 "total_amount": receipt.total_amount,
                 "tax_amount": receipt.tax_amount,
                 "subtotal": receipt.subtotal,
-                "currency": items_data.get("_metadata", {}).get("currency"),
+                "currency": receipt.currency,
                 "items": items_data.get("items", []) if isinstance(items_data, dict) else [],
                 "vat_breakdown": receipt.vat_breakdown or [],
                 "vat_percentage_effective": receipt.vat_percentage_effective,
@@ -424,7 +450,7 @@ async def update_receipt(
         image_path=receipt.image_path,
         confidence_score=receipt.confidence_score,
         extraction_date=receipt.extraction_date,
-        currency=metadata.get("currency"),
+        currency=receipt.currency,
         vat_percentage=receipt.vat_percentage_effective,  # Use effective VAT
         items_verified=bool(receipt.items_verified) if receipt.items_verified is not None else metadata.get("items_verified"),
         warnings=metadata.get("warnings", []),
@@ -433,9 +459,8 @@ async def update_receipt(
 
 
 @router.get("/rag/stats")
-async def get_rag_stats():
+def get_rag_stats():
     """Return RAG vector store statistics."""
-    from config import settings
     stats = get_store_stats()
     stats["rag_enabled"] = settings.RAG_ENABLED
     stats["embedding_model"] = settings.EMBEDDING_MODEL
@@ -445,7 +470,7 @@ async def get_rag_stats():
 
 
 @router.get("/file/{file_id}/stats")
-async def get_file_stats(
+def get_file_stats(
     file_id: str,
     db: Session = Depends(get_db)
 ):
@@ -455,10 +480,28 @@ async def get_file_stats(
     if not uploaded_file:
         raise HTTPException(status_code=404, detail="File not found")
     
-    # Get receipts
-    receipts = db.query(Receipt).filter(Receipt.file_id == file_id).all()
-    
-    receipts_extracted = len(receipts)
+    # Aggregate in SQL: one row back instead of hydrating every receipt
+    (
+        receipts_extracted,
+        avg_confidence,
+        no_merchant_name,
+        no_date,
+        no_total,
+        no_tax,
+        no_currency,
+    ) = db.query(
+        func.count(Receipt.id),
+        func.avg(Receipt.confidence_score),
+        _count_null(Receipt.merchant_name),
+        _count_null(Receipt.date),
+        _count_null(Receipt.total_amount),
+        _count_null(Receipt.tax_amount),
+        _count_null(Receipt.currency),
+    ).filter(Receipt.file_id == file_id).one()
+    # MySQL returns SUM() as Decimal
+    no_merchant_name, no_date, no_total, no_tax, no_currency = (
+        int(n) for n in (no_merchant_name, no_date, no_total, no_tax, no_currency)
+    )
 
     # Use real pipeline stats if available
     pipeline_stats = None
@@ -476,31 +519,19 @@ async def get_file_stats(
         pages_processed = max(receipts_extracted, 1)
         missing_estimate = 0
 
-    avg_confidence = 0.0
-    if receipts:
-        confidences = [r.confidence_score for r in receipts if r.confidence_score is not None]
-        if confidences:
-            avg_confidence = sum(confidences) / len(confidences)
-
     return {
         "file_id": file_id,
         "receipts_detected": receipts_detected,
         "receipts_extracted": receipts_extracted,
         "missing_receipts_estimate": missing_estimate,
-        "average_confidence": round(avg_confidence, 2),
-        "total_missing_fields": sum(
-            (1 if r.merchant_name is None else 0)
-            + (1 if r.date is None else 0)
-            + (1 if r.total_amount is None else 0)
-            + (1 if r.tax_amount is None else 0)
-            for r in receipts
-        ),
+        "average_confidence": round(avg_confidence or 0.0, 2),
+        "total_missing_fields": no_merchant_name + no_date + no_total + no_tax,
         "pages_processed": pages_processed,
         "error_breakdown": {
-            "no_merchant_name": sum(1 for r in receipts if r.merchant_name is None),
-            "no_date": sum(1 for r in receipts if r.date is None),
-            "no_total": sum(1 for r in receipts if r.total_amount is None),
-            "no_tax": sum(1 for r in receipts if r.tax_amount is None),
+            "no_merchant_name": no_merchant_name,
+            "no_date": no_date,
+            "no_total": no_total,
+            "no_tax": no_tax,
+            "no_currency": no_currency,
         },
     }
-
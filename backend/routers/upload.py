@@ -1,7 +1,9 @@
 """
 File upload endpoints.
 """
+import os
 from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from pathlib import Path
 
@@ -14,16 +16,22 @@ from config import settings
 
 router = APIRouter(prefix="/upload", tags=["Upload"])
 
+_IMAGE_EXTENSIONS = frozenset({".png", ".jpg", ".jpeg", ".bmp", ".tiff", ".tif", ".webp"})
+
+
+def _extension(filename: str) -> str:
+    """Return the lower-cased extension of a filename (including the dot)."""
+    return os.path.splitext(filename)[1].lower()
+
 
 def is_image_file(filename: str) -> bool:
     """Check if file is an image based on extension."""
-    image_extensions = [".png", ".jpg", ".jpeg", ".bmp", ".tiff", ".tif", ".webp"]
-    return any(filename.lower().endswith(ext) for ext in image_extensions)
+    return _extension(filename) in _IMAGE_EXTENSIONS
 
 
 def is_pdf_file(filename: str) -> bool:
     """Check if file is a PDF based on extension."""
-    return filename.lower().endswith(".pdf")
+    return _extension(filename) == ".pdf"
 
 
 @router.post("/file", response_model=UploadResponse)
@@ -83,21 +91,8 @@ async def _handle_upload(
                 detail=f"File size exceeds maximum of {settings.MAX_FILE_SIZE_MB}MB"
             )
         
-        # Save file
-        file_id, file_path = save_uploaded_file(file_content, file.filename)
-        
-        # Create database record
-        db_file = UploadedFile(
-            file_id=file_id,
-            original_filename=file.filename,
-            file_path=str(file_path),
-            file_size=file_size,
-            status="uploaded"
-        )
-        
-        db.add(db_file)
-        db.commit()
-        db.refresh(db_file)
+        # Disk write and DB commit are blocking — keep them off the event loop
+        file_id = await run_in_threadpool(_store_upload, file_content, file.filename, db)
         
         return UploadResponse(
             file_id=file_id,
@@ -114,3 +109,19 @@ async def _handle_upload(
             detail=f"Error uploading file: {str(e)}"
         )
 
+
+def _store_upload(file_content: bytes, filename: str, db: Session) -> str:
+    """Save the uploaded bytes to disk and create the database record."""
+    file_id, file_path = save_uploaded_file(file_content, filename)
+
+    db_file = UploadedFile(
+        file_id=file_id,
+        original_filename=filename,
+        file_path=str(file_path),
+        file_size=len(file_content),
+        status="uploaded"
+    )
+
+    db.add(db_file)
+    db.commit()
+    return file_id
@@ -5,26 +5,201 @@ Generates vector embeddings for receipt OCR text using a local embedding model
 (nomic-embed-text by default). These embeddings power the RAG pipeline by
 enabling semantic similarity search across previously processed receipts.
 """
+import hashlib
 import logging
-from typing import List, Optional
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Optional, Tuple
 
+import numpy as np
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from config import settings
 
 logger = logging.getLogger(__name__)
 
 _embedding_model_verified = False
+_verify_lock = threading.Lock()
+
+# Shared keep-alive session for all Ollama calls. The adapter retries busy /
+# transient server responses with backoff (POST included, since /api/embed
+# is side-effect free) and hands the final response back instead of raising.
+_session = requests.Session()
+_session.headers.update({"Connection": "keep-alive"})
+_session.mount(
+    settings.OLLAMA_BASE_URL,
+    HTTPAdapter(
+        pool_connections=8,
+        pool_maxsize=32,
+        max_retries=Retry(
+            total=3,
+            backoff_factor=0.2,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=frozenset({"GET", "POST"}),
+            raise_on_status=False,
+        ),
+    ),
+)
+
+# LRU of embeddings keyed by a hash of the stripped input text. Re-uploaded
+# or re-indexed receipts produce identical OCR text, so hits skip Ollama.
+# Entries are held as bfloat16 bytes (2 bytes/dim instead of a list of
+# Python floats), which keeps a full cache to a few MB.
+_embedding_cache: "OrderedDict[str, bytes]" = OrderedDict()
+_embedding_cache_lock = threading.Lock()
+
+
+def quantize_bf16(vec: List[float]) -> bytes:
+    """Pack a float vector as bfloat16 (round-to-nearest-even) bytes."""
+    bits = np.asarray(vec, dtype=np.float32).view(np.uint32).astype(np.uint64)
+    rounded = (bits + 0x7FFF + ((bits >> 16) & 1)) >> 16
+    return rounded.astype(np.uint16).tobytes()
+
+
+def dequantize_bf16(data: bytes) -> np.ndarray:
+    """Upcast bfloat16 bytes from quantize_bf16 back to a float32 array."""
+    return (np.frombuffer(data, dtype=np.uint16).astype(np.uint32) << 16).view(np.float32)
+
+
+def normalize_embedding(vec: List[float]) -> List[float]:
+    """
+    Scale a vector to unit L2 norm.
+
+    Every embedding this module returns (and caches) is unit-norm, so cosine
+    similarity between two of them is a plain dot product.
+    """
+    arr = np.asarray(vec, dtype=np.float32)
+    arr /= np.linalg.norm(arr) + 1e-12
+    return arr.tolist()
+
+
+def _cache_key(text: str) -> str:
+    """Hash of the (already stripped) text, scoped to the embedding model."""
+    return hashlib.blake2b(
+        f"{settings.EMBEDDING_MODEL}\0{text}".encode(), digest_size=16
+    ).hexdigest()
+
+
+def _cache_get(key: str) -> Optional[List[float]]:
+    with _embedding_cache_lock:
+        packed = _embedding_cache.get(key)
+        if packed is None:
+            return None
+        _embedding_cache.move_to_end(key)
+    return dequantize_bf16(packed).tolist()
+
+
+def _cache_put(key: str, vec: Optional[List[float]]) -> None:
+    """Remember a successful embedding; failures are never cached."""
+    if vec is None or settings.EMBED_CACHE_SIZE <= 0:
+        return
+    packed = quantize_bf16(vec)
+    with _embedding_cache_lock:
+        _embedding_cache[key] = packed
+        _embedding_cache.move_to_end(key)
+        while len(_embedding_cache) > settings.EMBED_CACHE_SIZE:
+            _embedding_cache.popitem(last=False)
+
+
+def _collect_pending(
+    texts: List[str], results: List[Optional[List[float]]]
+) -> List[Tuple[int, str, str]]:
+    """
+    Fill ``results`` from the cache and return the (index, text, key) triples
+    that still need embedding. Empty texts are left as None.
+    """
+    pending = []
+    for i, text in enumerate(texts):
+        if not text or not text.strip():
+            continue
+        stripped = text.strip()
+        key = _cache_key(stripped)
+        cached = _cache_get(key)
+        if cached is not None:
+            results[i] = cached
+        else:
+            pending.append((i, stripped, key))
+    return pending
+
+
+def _store_pending(
+    results: List[Optional[List[float]]],
+    pending: List[Tuple[int, str, str]],
+    chunk_results: List[List[Optional[List[float]]]],
+    batch_size: int,
+) -> None:
+    """Splice chunked embeddings back into ``results`` and cache them."""
+    for chunk_idx, vectors in enumerate(chunk_results):
+        for offset, vec in enumerate(vectors):
+            i, _, key = pending[chunk_idx * batch_size + offset]
+            results[i] = vec
+            _cache_put(key, vec)
+
+
+def _sentinel_path() -> Path:
+    return settings.CACHE_DIR / "embed_model.ok"
+
+
+def _sentinel_token() -> str:
+    """Identifies the (Ollama instance, model) pair a sentinel vouches for."""
+    return hashlib.sha256(
+        f"{settings.OLLAMA_BASE_URL}|{settings.EMBEDDING_MODEL}".encode()
+    ).hexdigest()
+
+
+def _sentinel_is_fresh() -> bool:
+    """True if another process verified this model within MODEL_VERIFY_TTL_SECS."""
+    path = _sentinel_path()
+    try:
+        if time.time() - path.stat().st_mtime > settings.MODEL_VERIFY_TTL_SECS:
+            return False
+        return path.read_text().strip() == _sentinel_token()
+    except OSError:
+        return False
+
+
+def _write_sentinel() -> None:
+    path = _sentinel_path()
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(_sentinel_token())
+    except OSError as e:
+        logger.debug(f"Could not write embedding model sentinel {path}: {e}")
 
 
 def verify_embedding_model() -> bool:
-    """Pull the embedding model if it isn't already available in Ollama."""
+    """
+    Pull the embedding model if it isn't already available in Ollama.
+
+    A successful check is remembered in-process and in a sentinel file under
+    CACHE_DIR, so new worker processes skip the /api/tags probe. Concurrent
+    first callers wait on a lock instead of each issuing /api/pull.
+    """
     global _embedding_model_verified
     if _embedding_model_verified:
         return True
 
+    with _verify_lock:
+        if _embedding_model_verified:
+            return True
+        if _probe_embedding_model():
+            _embedding_model_verified = True
+            _write_sentinel()
+            return True
+        return False
+
+
+def _probe_embedding_model() -> bool:
+    """Check /api/tags for the embedding model, pulling it when missing."""
     try:
-        resp = requests.get(f"{settings.OLLAMA_BASE_URL}/api/tags", timeout=5)
+        resp = _session.get(f"{settings.OLLAMA_BASE_URL}/api/tags", timeout=5)
         if resp.status_code != 200:
             logger.warning("Cannot reach Ollama to verify embedding model")
             return False
@@ -36,7 +211,7 @@ def verify_embedding_model() -> bool:
         found = any(model == n or n.startswith(f"{model}:") for n in model_names)
         if not found:
             logger.info(f"Embedding model '{model}' not found locally, pulling...")
-            pull_resp = requests.post(
+            pull_resp = _session.post(
                 f"{settings.OLLAMA_BASE_URL}/api/pull",
                 json={"name": model, "stream": False},
                 timeout=600,
@@ -46,7 +221,6 @@ def verify_embedding_model() -> bool:
                 return False
             logger.info(f"Successfully pulled embedding model '{model}'")
 
-        _embedding_model_verified = True
         return True
     except requests.exceptions.ConnectionError:
         logger.warning(f"Cannot connect to Ollama at {settings.OLLAMA_BASE_URL} for embedding model check")
@@ -56,32 +230,51 @@ def verify_embedding_model() -> bool:
         return False
 
 
+def warm_up_embedding_model() -> bool:
+    """
+    Embed a tiny string so Ollama loads the embedding model into memory
+    before the first real request. Bypasses the embedding cache.
+    """
+    return _embed_chunk(["warmup"])[0] is not None
+
+
+_embedding_model_verified = _sentinel_is_fresh()
+
+
 def generate_embedding(text: str) -> Optional[List[float]]:
     """
     Generate a vector embedding for the given text via Ollama's /api/embed endpoint.
 
-    Returns None on failure so callers can degrade gracefully.
+    The vector is L2-normalized. Returns None on failure so callers can degrade gracefully.
     """
     if not text or not text.strip():
         return None
 
+    stripped = text.strip()
+    key = _cache_key(stripped)
+    cached = _cache_get(key)
+    if cached is not None:
+        return cached
+
     try:
-        resp = requests.post(
+        resp = _session.post(
             f"{settings.OLLAMA_BASE_URL}/api/embed",
-            json={"model": settings.EMBEDDING_MODEL, "input": text.strip()},
+            json={"model": settings.EMBEDDING_MODEL, "input": stripped},
             timeout=60,
         )
         if resp.status_code != 200:
             logger.error(f"Ollama embed API error {resp.status_code}: {resp.text[:300]}")
             return None
 
-        data = resp.json()
+        data = orjson.loads(resp.content)
 
         # /api/embed returns {"embeddings": [[...]]}
         embeddings = data.get("embeddings") or data.get("embedding")
         if isinstance(embeddings, list) and len(embeddings) > 0:
             vec = embeddings[0] if isinstance(embeddings[0], list) else embeddings
             if vec and len(vec) > 0:
+                vec = normalize_embedding(vec)
+                _cache_put(key, vec)
                 return vec
 
         logger.warning("Ollama embed response missing embedding data")
@@ -95,6 +288,70 @@ def generate_embedding(text: str) -> Optional[List[float]]:
         return None
 
 
+def _embed_chunk(texts: List[str]) -> List[Optional[List[float]]]:
+    """
+    Embed a list of non-empty texts with a single /api/embed request.
+
+    Returns a list aligned with ``texts``; on failure every entry is None.
+    """
+    try:
+        resp = _session.post(
+            f"{settings.OLLAMA_BASE_URL}/api/embed",
+            json={"model": settings.EMBEDDING_MODEL, "input": texts},
+            timeout=60 + 2 * len(texts),
+        )
+
+        if resp.status_code != 200:
+            logger.error(f"Ollama embed API error {resp.status_code}: {resp.text[:300]}")
+            return [None] * len(texts)
+
+        # orjson parses large float arrays several times faster than stdlib json
+        embeddings = orjson.loads(resp.content).get("embeddings") or []
+        if len(embeddings) != len(texts):
+            logger.warning(
+                f"Ollama embed returned {len(embeddings)} embedding(s) for {len(texts)} input(s)"
+            )
+            return [None] * len(texts)
+
+        return [normalize_embedding(vec) if vec else None for vec in embeddings]
+
+    except requests.exceptions.ConnectionError:
+        logger.warning("Cannot connect to Ollama for embedding generation")
+        return [None] * len(texts)
+    except Exception as e:
+        logger.error(f"Error generating batch embeddings: {e}")
+        return [None] * len(texts)
+
+
+def _embed_chunk_jittered(texts: List[str]) -> List[Optional[List[float]]]:
+    """_embed_chunk for pool workers: small jitter so concurrent chunks don't hit Ollama in lockstep."""
+    time.sleep(random.uniform(0, 0.05))
+    return _embed_chunk(texts)
+
+
 def generate_embeddings_batch(texts: List[str]) -> List[Optional[List[float]]]:
-    """Generate embeddings for multiple texts. Returns a list aligned with input."""
-    return [generate_embedding(t) for t in texts]
+    """
+    Generate embeddings for multiple texts. Returns a list aligned with input.
+
+    Non-empty texts are sent to /api/embed as an array (one request per
+    EMBED_BATCH_SIZE texts) so Ollama embeds them in a single forward pass;
+    empty texts map to None and cached texts are not re-sent. When there is more than one chunk, up to
+    EMBED_MAX_CONCURRENCY chunks are in flight at once.
+    """
+    results: List[Optional[List[float]]] = [None] * len(texts)
+    pending = _collect_pending(texts, results)
+
+    batch_size = max(1, settings.EMBED_BATCH_SIZE)
+    misses = [text for _, text, _ in pending]
+    chunks = [misses[start:start + batch_size] for start in range(0, len(misses), batch_size)]
+
+    if len(chunks) <= 1:
+        chunk_results = [_embed_chunk(chunk) for chunk in chunks]
+    else:
+        workers = max(1, min(settings.EMBED_MAX_CONCURRENCY, len(chunks)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # map() yields in submission order, so chunk k starts at k * batch_size
+            chunk_results = list(executor.map(_embed_chunk_jittered, chunks))
+
+    _store_pending(results, pending, chunk_results, batch_size)
+    return results
@@ -5,6 +5,8 @@ import json
 import re
 import requests
 import logging
+import threading
+import time
 from functools import lru_cache
 from pathlib import Path
 from typing import Dict, Any, Optional, List
@@ -15,6 +17,10 @@ from config import settings
 
 logger = logging.getLogger(__name__)
 
+# (monotonic time of last probe, result) for check_ollama_connection
+_connection_check = (None, False)
+_connection_check_lock = threading.Lock()
+
 PROMPT_CONFIG_PATH = (
     Path(__file__).resolve().parent.parent / "prompts" / "receipt_extraction.yml"
 )
@@ -834,10 +840,26 @@ def validate_extracted_fields(data: Dict[str, Any]) -> Dict[str, Any]:
 def check_ollama_connection() -> bool:
     """
     Check if Ollama is running and accessible.
-    
+
+    The result of the /api/tags probe is reused for OLLAMA_CHECK_TTL_SECS,
+    so back-to-back files and per-receipt extraction calls don't each pay
+    an HTTP round-trip.
+
     Returns:
         True if Ollama is accessible, False otherwise
     """
+    global _connection_check
+    with _connection_check_lock:
+        checked_at, ok = _connection_check
+        if checked_at is not None and time.monotonic() - checked_at < settings.OLLAMA_CHECK_TTL_SECS:
+            return ok
+        ok = _probe_ollama_connection()
+        _connection_check = (time.monotonic(), ok)
+        return ok
+
+
+def _probe_ollama_connection() -> bool:
+    """Query /api/tags and pick a fallback model if the configured one is missing."""
     try:
         response = requests.get(
             f"{settings.OLLAMA_BASE_URL}/api/tags",
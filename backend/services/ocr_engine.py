@@ -6,6 +6,7 @@ Python 3.13 with a NotImplementedError in the oneDNN executor.
 Tesseract is used as the primary (and only) OCR engine now.
 """
 from pathlib import Path
+from typing import Optional
 import logging
 from config import settings
 
@@ -17,14 +18,20 @@ logger = logging.getLogger(__name__)
 MAX_IMAGE_SIDE = 4000
 
 
-def _prepare_image(image_path: Path):
+def _prepare_image(image):
     """
     Open an image and downscale if either dimension exceeds MAX_IMAGE_SIDE.
+    Accepts a file path, a PIL Image or a numpy pixel array.
     Returns a PIL Image ready for OCR.
     """
     from PIL import Image
 
-    img = Image.open(image_path)
+    if isinstance(image, Image.Image):
+        img = image
+    elif isinstance(image, (str, Path)):
+        img = Image.open(image)
+    else:
+        img = Image.fromarray(image)
     w, h = img.size
 
     if max(w, h) > MAX_IMAGE_SIDE:
@@ -195,7 +202,7 @@ def _preprocess_for_ocr(img):
         return img
 
 
-def run_ocr(image_path: Path) -> str:
+def run_ocr(image_path, dpi: Optional[int] = None) -> str:
     """
     Extract text from an image using Tesseract OCR.
 
@@ -203,14 +210,22 @@ def run_ocr(image_path: Path) -> str:
     - Tries Dutch+English first, falls back to English only.
 
     Args:
-        image_path: Path to the image file.
+        image_path: Path to the image file, or an in-memory PIL Image /
+            numpy pixel array (e.g. a page from render_pdf_pages).
+        dpi: Resolution the image was rendered at, passed to Tesseract as
+            a hint. Only known for pages rendered from a PDF; photos and
+            scans are left to Tesseract's own estimate.
 
     Returns:
         Extracted text as a string.
     """
-    image_path = Path(image_path)
-    if not image_path.exists():
-        raise FileNotFoundError(f"Image not found: {image_path}")
+    if isinstance(image_path, (str, Path)):
+        image_path = Path(image_path)
+        if not image_path.exists():
+            raise FileNotFoundError(f"Image not found: {image_path}")
+        source_name = image_path.name
+    else:
+        source_name = "in-memory image"
 
     try:
         import pytesseract
@@ -224,20 +239,22 @@ def run_ocr(image_path: Path) -> str:
     img = _detect_receipt_region(img)
     img = _preprocess_for_ocr(img)
 
+    config = f"--dpi {dpi}" if dpi else ""
+
     # Try Dutch+English, fall back to English only
     try:
-        text = pytesseract.image_to_string(img, lang="nld+eng", config="--dpi 200")
+        text = pytesseract.image_to_string(img, lang="nld+eng", config=config)
     except Exception:
-        text = pytesseract.image_to_string(img, lang="eng", config="--dpi 200")
+        text = pytesseract.image_to_string(img, lang="eng", config=config)
 
     text = text.strip()
 
     if text:
         logger.info(
-            f"Tesseract extracted {len(text)} chars from {image_path.name}"
+            f"Tesseract extracted {len(text)} chars from {source_name}"
         )
     else:
-        logger.warning(f"Tesseract found no text in {image_path.name}")
+        logger.warning(f"Tesseract found no text in {source_name}")
 
     return text
 
@@ -1,5 +1,5 @@
 """
-PDF text extraction using langchain-community's PyPDFLoader.
+PDF text extraction using pypdfium2's text pages.
 
 Extracts text per page. For scanned PDFs with little/no selectable text,
 signals that the page needs OCR fallback.
@@ -8,14 +8,16 @@ from pathlib import Path
 from typing import List, Dict, Any, Optional
 import logging
 
+import pypdfium2 as pdfium
+
 logger = logging.getLogger(__name__)
 
 MIN_TEXT_LENGTH_FOR_EXTRACTION = 40
 
 
-def extract_text_from_pdf(pdf_path: Path) -> List[Dict[str, Any]]:
+def extract_page_texts(pdf: pdfium.PdfDocument) -> List[Dict[str, Any]]:
     """
-    Extract text from each page of a PDF using langchain PyPDFLoader.
+    Extract text from each page of an already-open PDF document.
 
     Returns a list of dicts, one per page:
         {
@@ -24,24 +26,43 @@ def extract_text_from_pdf(pdf_path: Path) -> List[Dict[str, Any]]:
             "has_text": bool (True if enough text for LLM extraction),
         }
     """
-    from langchain_community.document_loaders import PyPDFLoader
-
-    pdf_path = Path(pdf_path)
-    if not pdf_path.exists():
-        raise FileNotFoundError(f"PDF not found: {pdf_path}")
-
-    loader = PyPDFLoader(str(pdf_path))
-    documents = loader.load()
-
     pages: List[Dict[str, Any]] = []
-    for doc in documents:
-        page_num = doc.metadata.get("page", len(pages)) + 1
-        text = (doc.page_content or "").strip()
+    for page_index in range(len(pdf)):
+        page = pdf.get_page(page_index)
+        try:
+            textpage = page.get_textpage()
+            try:
+                text = textpage.get_text_bounded() or ""
+            finally:
+                textpage.close()
+        finally:
+            page.close()
+
+        # pdfium separates lines with CRLF
+        text = text.replace("\r\n", "\n").strip()
         pages.append({
-            "page_number": page_num,
+            "page_number": page_index + 1,
             "text": text,
             "has_text": len(text) >= MIN_TEXT_LENGTH_FOR_EXTRACTION,
         })
+    return pages
+
+
+def extract_text_from_pdf(pdf_path: Path) -> List[Dict[str, Any]]:
+    """
+    Extract text from each page of a PDF using pypdfium2.
+
+    See extract_page_texts for the shape of the returned page dicts.
+    """
+    pdf_path = Path(pdf_path)
+    if not pdf_path.exists():
+        raise FileNotFoundError(f"PDF not found: {pdf_path}")
+
+    pdf = pdfium.PdfDocument(str(pdf_path))
+    try:
+        pages = extract_page_texts(pdf)
+    finally:
+        pdf.close()
 
     logger.info(
         f"Extracted text from {len(pages)} page(s) of {pdf_path.name} "
@@ -55,5 +76,5 @@ def extract_text_from_pdf_safe(pdf_path: Path) -> Optional[List[Dict[str, Any]]]
     try:
         return extract_text_from_pdf(pdf_path)
     except Exception as e:
-        logger.warning(f"langchain PDF text extraction failed: {e}")
+        logger.warning(f"PDF text extraction failed: {e}")
         return None
@@ -1,28 +1,82 @@
 """
 PDF processing utilities using pypdfium2.
 """
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
 import pypdfium2 as pdfium
 from PIL import Image
 import io
 import logging
+import multiprocessing
+import os
+import threading
+
+from config import settings
 
 import cv2
 import numpy as np
 
 logger = logging.getLogger(__name__)
 
+# Worker processes for page rendering, started on first multi-page PDF and
+# reused afterwards so each upload doesn't pay process start-up again.
+_RENDER_WORKERS = min(os.cpu_count() or 1, 4)
+_render_pool = None
+_render_pool_lock = threading.Lock()
 
-def crop_to_content(pil_image: Image.Image, margin_px: int = 20) -> Image.Image:
+
+def _get_render_pool() -> ProcessPoolExecutor:
+    """Return the shared render process pool, creating it if needed."""
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is None:
+            # spawn: forking a process that already runs server threads can deadlock
+            _render_pool = ProcessPoolExecutor(
+                max_workers=_RENDER_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _render_pool
+
+
+# Open documents shared by nested open_pdf() calls: key -> [document, users]
+_pdf_cache: Dict[tuple, list] = {}
+
+
+@contextmanager
+def open_pdf(pdf_path: Path) -> Iterator[pdfium.PdfDocument]:
     """
-    Crop whitespace around receipt content in a PDF-rendered image.
+    Open a PDF, reusing the handle if the same file is already open.
 
-    Only crops if removing at least 10% of the image area so that
-    already-tight images are left untouched.
+    Handles are keyed by (thread, path, mtime, size) so a changed file is
+    reopened and a handle is never shared between threads (pdfium is not
+    thread-safe). The document is closed when its outermost user exits.
     """
-    img_array = np.array(pil_image)
+    pdf_path = Path(pdf_path)
+    st = pdf_path.stat()
+    key = (threading.get_ident(), str(pdf_path.resolve()), st.st_mtime_ns, st.st_size)
 
+    entry = _pdf_cache.get(key)
+    if entry is None:
+        entry = _pdf_cache[key] = [pdfium.PdfDocument(str(pdf_path)), 0]
+    entry[1] += 1
+    try:
+        yield entry[0]
+    finally:
+        entry[1] -= 1
+        if entry[1] == 0:
+            del _pdf_cache[key]
+            entry[0].close()
+
+
+def _content_box(img_array: np.ndarray, margin_px: int = 20) -> Optional[Tuple[int, int, int, int]]:
+    """
+    Find the (x1, y1, x2, y2) box around receipt content in a rendered page.
+
+    Returns None when cropping is not worthwhile: the page is blank, or the
+    box would remove less than 10% of the image area.
+    """
     # Sample border pixels to detect background colour (median of edges)
     top = img_array[0, :]
     bottom = img_array[-1, :]
@@ -39,8 +93,8 @@ def crop_to_content(pil_image: Image.Image, margin_px: int = 20) -> Image.Image:
 
     coords = cv2.findNonZero(mask)
     if coords is None:
-        # Entire image is background – return as-is
-        return pil_image
+        # Entire image is background
+        return None
 
     x, y, w, h = cv2.boundingRect(coords)
 
@@ -55,67 +109,207 @@ def crop_to_content(pil_image: Image.Image, margin_px: int = 20) -> Image.Image:
     content_area = (x2 - x1) * (y2 - y1)
     total_area = img_w * img_h
     if content_area >= total_area * 0.9:
-        return pil_image
+        return None
 
     logger.debug(
         f"Cropping PDF image from {img_w}x{img_h} to {x2-x1}x{y2-y1} "
         f"(saved {100 - content_area / total_area * 100:.0f}% area)"
     )
-    return pil_image.crop((x1, y1, x2, y2))
+    return x1, y1, x2, y2
 
 
-def pdf_to_images(pdf_path: Path, output_dir: Path) -> List[Path]:
+def crop_to_content(pil_image: Image.Image, margin_px: int = 20) -> Image.Image:
+    """
+    Crop whitespace around receipt content in a PDF-rendered image.
+
+    Only crops if removing at least 10% of the image area so that
+    already-tight images are left untouched.
+    """
+    box = _content_box(np.array(pil_image), margin_px)
+    return pil_image.crop(box) if box else pil_image
+
+
+def _save_page_image(pil_image: Image.Image, out_path: str) -> None:
+    """Save a rendered page as JPEG (.jpg) or PNG, favouring encode speed."""
+    if out_path.endswith(".jpg"):
+        pil_image.save(out_path, "JPEG", quality=92)
+    else:
+        # compress_level 1 encodes ~3x faster than Pillow's default of 6
+        pil_image.save(out_path, "PNG", compress_level=1)
+
+
+def page_image_path(pdf_path: Path, output_dir: Path, page_index: int) -> Path:
+    """Where a rendered page image is written (PDF_RENDER_FORMAT extension)."""
+    ext = "jpg" if settings.PDF_RENDER_FORMAT.lower() in ("jpg", "jpeg") else "png"
+    return output_dir / f"{pdf_path.stem}_page_{page_index + 1}.{ext}"
+
+
+def save_page_array(pixels: np.ndarray, out_path: Path) -> None:
+    """Write a page rendered by render_pdf_pages to ``out_path``."""
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    _save_page_image(Image.fromarray(pixels), str(out_path))
+
+
+def _iter_page_arrays(
+    pdf: pdfium.PdfDocument, page_indices: Sequence[int], scale: float, grayscale: bool = False
+) -> Iterator[Tuple[int, np.ndarray]]:
+    """
+    Lazily render pages of an open document, yielding (page_index, pixels).
+
+    Replaces the deprecated PdfDocument.render(): one page is rendered per
+    step, and its bitmap is only released once the caller asks for the next
+    page, so whatever the loop body does (e.g. saving) throttles rendering.
+    Each array is a view into the page bitmap, cropped to its content, and is
+    only valid until the next page is requested.
+    """
+    for page_index in page_indices:
+        page = pdf.get_page(page_index)
+        try:
+            # rev_byteorder gives RGB instead of pdfium's native BGR
+            bitmap = page.render(scale=scale, grayscale=grayscale, rev_byteorder=True)
+            try:
+                arr = bitmap.to_numpy()
+                if arr.shape[2] == 1:
+                    arr = arr[:, :, 0]  # grayscale renders come back as (h, w, 1)
+                box = _content_box(arr)
+                if box:
+                    x1, y1, x2, y2 = box
+                    arr = arr[y1:y2, x1:x2]
+                yield page_index, arr
+            finally:
+                bitmap.close()
+        finally:
+            page.close()
+
+
+def _iter_page_images(
+    pdf: pdfium.PdfDocument, page_indices: Sequence[int], scale: float, grayscale: bool = False
+) -> Iterator[Tuple[int, Image.Image]]:
+    """Like _iter_page_arrays, but yields PIL images for saving."""
+    for page_index, arr in _iter_page_arrays(pdf, page_indices, scale, grayscale):
+        yield page_index, Image.fromarray(arr)
+
+
+def render_pdf_pages(
+    pdf_path: Path, page_indices: Optional[Sequence[int]] = None
+) -> Iterator[Tuple[int, np.ndarray]]:
+    """
+    Render PDF pages in memory, yielding (page_index, pixels) per page.
+
+    Uses PDF_RENDER_DPI / PDF_RENDER_GRAYSCALE. Nothing is encoded or written
+    to disk; each array is a zero-copy view into the page bitmap and is only
+    valid until the next page is requested, so consume (e.g. OCR) each page
+    inside the loop body.
+
+    Args:
+        pdf_path: Path to the PDF file
+        page_indices: 0-based pages to render (default: all pages)
+    """
+    scale = settings.PDF_RENDER_DPI / 72
+    with open_pdf(pdf_path) as pdf:
+        if page_indices is None:
+            page_indices = range(len(pdf))
+        yield from _iter_page_arrays(pdf, page_indices, scale, settings.PDF_RENDER_GRAYSCALE)
+
+
+def _render_pages(
+    pdf_path_str: str,
+    page_indices: Sequence[int],
+    scale: float,
+    out_paths: Sequence[str],
+    grayscale: bool = False,
+) -> List[str]:
+    """
+    Render a run of PDF pages and save each one as an image.
+
+    Top-level so it can run in a worker process. Each call opens its own
+    PdfDocument (pdfium handles must not be shared across processes/threads)
+    once for its whole page range, and images are written inside the worker
+    so only paths cross the pipe.
+    """
+    pdf = pdfium.PdfDocument(pdf_path_str)
+    try:
+        for (_, pil_image), out_path in zip(
+            _iter_page_images(pdf, page_indices, scale, grayscale), out_paths
+        ):
+            _save_page_image(pil_image, out_path)
+    finally:
+        pdf.close()
+    return list(out_paths)
+
+
+def _render_to_files(
+    pdf: pdfium.PdfDocument, pdf_path: Path, output_dir: Path, page_indices: Sequence[int]
+) -> List[Path]:
+    """
+    Render the given pages of ``pdf`` into ``output_dir`` and return the paths.
+
+    A single page is rendered in-process from the already-open handle;
+    several pages are split into contiguous ranges rendered across a small
+    process pool (up to 4 workers, each opening the PDF once).
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    # PDF user space is 72 DPI; PDF_RENDER_DPI defaults to 200
+    scale = settings.PDF_RENDER_DPI / 72
+    grayscale = settings.PDF_RENDER_GRAYSCALE
+    out_paths = [str(page_image_path(pdf_path, output_dir, page_index)) for page_index in page_indices]
+    n_pages = len(out_paths)
+
+    if n_pages < 2 or _RENDER_WORKERS < 2:
+        for (_, pil_image), out_path in zip(
+            _iter_page_images(pdf, page_indices, scale, grayscale), out_paths
+        ):
+            _save_page_image(pil_image, out_path)
+        return [Path(p) for p in out_paths]
+
+    n_chunks = min(_RENDER_WORKERS, n_pages)
+    bounds = [round(i * n_pages / n_chunks) for i in range(n_chunks + 1)]
+    rendered = []
+    for chunk in _get_render_pool().map(
+        _render_pages,
+        [str(pdf_path)] * n_chunks,
+        [page_indices[bounds[i]:bounds[i + 1]] for i in range(n_chunks)],
+        [scale] * n_chunks,
+        [out_paths[bounds[i]:bounds[i + 1]] for i in range(n_chunks)],
+        [grayscale] * n_chunks,
+    ):
+        rendered.extend(chunk)
+    return [Path(p) for p in rendered]
+
+
+def pdf_to_images(
+    pdf_path: Path, output_dir: Path, page_indices: Optional[List[int]] = None
+) -> List[Path]:
     """
     Convert PDF pages to images.
+
+    Multi-page PDFs are split into contiguous page ranges rendered across a
+    small process pool (up to 4 workers); single-page PDFs are rendered
+    in-process to avoid the round-trip to a worker.
     
     Args:
         pdf_path: Path to the PDF file
         output_dir: Directory to save images
+        page_indices: 0-based pages to render (default: all pages)
         
     Returns:
-        List of paths to generated images
+        List of paths to generated images, in ``page_indices`` order
     """
-    output_dir.mkdir(parents=True, exist_ok=True)
-    image_paths = []
-    
     try:
-        # Open PDF
-        pdf = pdfium.PdfDocument(str(pdf_path))
-        
-        # Convert each page to image
-        for page_num in range(len(pdf)):
-            page = pdf.get_page(page_num)
-            
-            # Render page to image (200 DPI — good balance of quality vs size)
-            bitmap = page.render(scale=200/72)  # 72 is default DPI
-            pil_image = bitmap.to_pil()
-            pil_image = crop_to_content(pil_image)
-
-            # Save image
-            image_filename = f"{pdf_path.stem}_page_{page_num + 1}.png"
-            image_path = output_dir / image_filename
-            pil_image.save(image_path, "PNG")
-            image_paths.append(image_path)
-            
-            # Clean up
-            bitmap.close()
-            page.close()
-        
-        pdf.close()
-        
+        with open_pdf(pdf_path) as pdf:
+            if page_indices is None:
+                page_indices = list(range(len(pdf)))
+            return _render_to_files(pdf, pdf_path, output_dir, page_indices)
     except Exception as e:
         raise Exception(f"Error converting PDF to images: {str(e)}")
-    
-    return image_paths
 
 
 def get_pdf_page_count(pdf_path: Path) -> int:
     """Get the number of pages in a PDF."""
     try:
-        pdf = pdfium.PdfDocument(str(pdf_path))
-        count = len(pdf)
-        pdf.close()
-        return count
+        with open_pdf(pdf_path) as pdf:
+            return len(pdf)
     except Exception:
         return 0
 
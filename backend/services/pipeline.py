@@ -2,7 +2,7 @@
 End-to-end receipt processing pipeline.
 
 PDF path (primary):
-    PDF → langchain text extraction per page → LLM → DB
+    PDF → pypdfium2 text extraction per page → LLM → DB
     Falls back to image + OCR for scanned pages with no selectable text.
 
 Image path:
@@ -10,22 +10,65 @@ Image path:
 """
 from pathlib import Path
 from typing import List, Dict, Any
+from sqlalchemy import bindparam, insert, select
 from sqlalchemy.orm import Session
-import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import islice
 import logging
+import os
+import shutil
+import threading
 import time
 
+import numpy as np
+
 from config import settings
-from services.pdf_text_extractor import extract_text_from_pdf_safe
-from services.pdf_utils import pdf_to_images
+from services.pdf_text_extractor import extract_page_texts
+from services.pdf_utils import open_pdf, page_image_path, pdf_to_images, render_pdf_pages, save_page_array
 from services.ocr_engine import run_ocr
 from services.llm_extractor import extract_fields_llm, check_ollama_connection
 from services.rag_service import retrieve_examples, build_few_shot_block, cross_validate
-from services.vector_store import index_receipt
+from services.vector_store import index_receipts_bulk
+from services.embedding_service import generate_embedding
 from models.db_models import Receipt, UploadedFile
 
 logger = logging.getLogger(__name__)
 
+_VALID_CURRENCIES = frozenset({"EUR", "USD", "GBP"})
+_CURRENCY_SYMBOL_MAP = {"€": "EUR", "$": "USD", "£": "GBP"}
+# Rewrites symbols embedded in longer values ("€ EUR", "12.50 £") to codes
+_CURRENCY_TRANS = str.maketrans({sym: f" {code} " for sym, code in _CURRENCY_SYMBOL_MAP.items()})
+
+# Fields that count towards the confidence score
+_KEY_FIELDS = ("merchant_name", "date", "total_amount", "tax_amount", "currency")
+# Fields reported as missing on high-confidence extractions
+_REPORTED_KEY_FIELDS = ("merchant_name", "date", "total_amount", "tax_amount", "vat_percentage", "currency")
+
+# file_id is a unique column, not the primary key, so Session.get() does not
+# apply; the statement is built once and reused
+_UPLOADED_FILE_BY_ID = select(UploadedFile).where(UploadedFile.file_id == bindparam("file_id"))
+
+_IMAGE_EXTENSIONS = frozenset({".png", ".jpg", ".jpeg", ".bmp", ".tiff", ".tif", ".webp"})
+
+_AMOUNT_FIELDS = ("total_amount", "tax_amount", "vat_amount", "subtotal")
+_TEXT_FIELDS = ("merchant_name", "date", "payment_method", "address", "phone")
+
+# Runs RAG retrieval alongside the LLM call when RAG_SPECULATIVE_EXTRACTION is
+# on; created on first use so the default configuration starts no threads
+_rag_executor = None
+_rag_executor_lock = threading.Lock()
+
+
+def _get_rag_executor() -> ThreadPoolExecutor:
+    """Return the shared speculative-retrieval pool, creating it if needed."""
+    global _rag_executor
+    with _rag_executor_lock:
+        if _rag_executor is None:
+            _rag_executor = ThreadPoolExecutor(
+                max_workers=max(1, settings.PAGE_CONCURRENCY), thread_name_prefix="rag"
+            )
+        return _rag_executor
+
 
 def normalize_extracted_fields(extracted_fields: Dict[str, Any]) -> Dict[str, Any]:
     """
@@ -35,18 +78,16 @@ def normalize_extracted_fields(extracted_fields: Dict[str, Any]) -> Dict[str, An
     - Normalize currency strings
     - Strip whitespace from text fields
     - Infer VAT percentage if missing
+
+    The dict is normalized in place (no copy) and returned.
     """
-    normalized = extracted_fields.copy()
+    normalized = extracted_fields
     
     # Round amounts to 2 decimal places
-    if normalized.get("total_amount") is not None:
-        normalized["total_amount"] = round(float(normalized["total_amount"]), 2)
-    if normalized.get("tax_amount") is not None:
-        normalized["tax_amount"] = round(float(normalized["tax_amount"]), 2)
-    if normalized.get("vat_amount") is not None:
-        normalized["vat_amount"] = round(float(normalized["vat_amount"]), 2)
-    if normalized.get("subtotal") is not None:
-        normalized["subtotal"] = round(float(normalized["subtotal"]), 2)
+    for field in _AMOUNT_FIELDS:
+        value = normalized.get(field)
+        if value is not None:
+            normalized[field] = round(float(value), 2)
     
     # Normalize VAT percentage: round to 1 decimal place, infer if missing
     if normalized.get("vat_percentage") is not None:
@@ -61,19 +102,16 @@ def normalize_extracted_fields(extracted_fields: Dict[str, Any]) -> Dict[str, An
                 inferred_vat_pct = (tax / subtotal) * 100
                 normalized["vat_percentage"] = round(inferred_vat_pct, 1)
     
-    # Normalize currency: only allow valid 3-letter codes
-    valid_currencies = {"EUR", "USD", "GBP"}
+    # Normalize currency: only allow valid 3-letter codes or map common symbols
     if normalized.get("currency"):
         currency = str(normalized["currency"]).strip().upper()
-        if currency in valid_currencies:
+        if currency in _VALID_CURRENCIES:
             normalized["currency"] = currency
+        elif currency in _CURRENCY_SYMBOL_MAP:
+            normalized["currency"] = _CURRENCY_SYMBOL_MAP[currency]
         else:
-            # Try to map common symbols
-            currency_map = {"€": "EUR", "$": "USD"}
-            if currency in currency_map:
-                normalized["currency"] = currency_map[currency]
-            else:
-                normalized["currency"] = None
+            tokens = currency.translate(_CURRENCY_TRANS).split()
+            normalized["currency"] = next((t for t in tokens if t in _VALID_CURRENCIES), None)
     
     # Safety fallback: Default to EUR if currency is not detected
     # This is a reasonable default for Dutch receipts and many European receipts
@@ -82,16 +120,10 @@ def normalize_extracted_fields(extracted_fields: Dict[str, Any]) -> Dict[str, An
         normalized["currency"] = "EUR"
     
     # Strip whitespace from text fields
-    if normalized.get("merchant_name"):
-        normalized["merchant_name"] = str(normalized["merchant_name"]).strip() or None
-    if normalized.get("date"):
-        normalized["date"] = str(normalized["date"]).strip() or None
-    if normalized.get("payment_method"):
-        normalized["payment_method"] = str(normalized["payment_method"]).strip() or None
-    if normalized.get("address"):
-        normalized["address"] = str(normalized["address"]).strip() or None
-    if normalized.get("phone"):
-        normalized["phone"] = str(normalized["phone"]).strip() or None
+    for field in _TEXT_FIELDS:
+        value = normalized.get(field)
+        if value:
+            normalized[field] = str(value).strip() or None
     
     return normalized
 
@@ -100,18 +132,14 @@ def add_missing_field_metadata(extracted_fields: Dict[str, Any], confidence_scor
     Add metadata for missing fields when confidence is high (>0.90).
     Returns fields with 'missing' and 'reason' metadata.
     """
-    metadata = {}
-    key_fields = ["merchant_name", "date", "total_amount", "tax_amount", "vat_percentage", "currency"]
-    
-    if confidence_score > 0.90:
-        for field in key_fields:
-            if extracted_fields.get(field) is None:
-                metadata[field] = {
-                    "missing": True,
-                    "reason": "high confidence but field missing"
-                }
-    
-    return metadata
+    if confidence_score <= 0.90:
+        return {}
+
+    return {
+        field: {"missing": True, "reason": "high confidence but field missing"}
+        for field in _REPORTED_KEY_FIELDS
+        if extracted_fields.get(field) is None
+    }
 
 def calculate_confidence_score(extracted_fields: Dict[str, Any], llm_success: bool, ocr_text: str) -> float:
     """
@@ -132,22 +160,21 @@ def calculate_confidence_score(extracted_fields: Dict[str, Any], llm_success: bo
         score += 0.35
 
     # Factor 2: Key fields present (30%)
-    key_fields = ["merchant_name", "date", "total_amount", "tax_amount", "currency"]
-    extracted_count = sum(1 for field in key_fields if extracted_fields.get(field) is not None)
-    field_score = (extracted_count / len(key_fields)) * 0.30
+    extracted_count = sum(1 for field in _KEY_FIELDS if extracted_fields.get(field) is not None)
+    field_score = (extracted_count / len(_KEY_FIELDS)) * 0.30
     score += field_score
 
     # Factor 3: OCR text quality (15%)
-    if ocr_text and len(ocr_text.strip()) > 0:
-        text_length = len(ocr_text.strip())
-        if text_length >= 50:
-            unique_chars = len(set(ocr_text.strip().lower()))
-            if unique_chars >= 10:
-                score += 0.15
-            elif unique_chars >= 5:
-                score += 0.075
-        elif text_length >= 20:
+    text = ocr_text.strip() if ocr_text else ""
+    text_length = len(text)
+    if text_length >= 50:
+        unique_chars = len(set(text.lower()))
+        if unique_chars >= 10:
+            score += 0.15
+        elif unique_chars >= 5:
             score += 0.075
+    elif text_length >= 20:
+        score += 0.075
 
     # Factor 4: Item quality (20%)
     items = extracted_fields.get("items") or []
@@ -171,12 +198,19 @@ def calculate_confidence_score(extracted_fields: Dict[str, Any], llm_success: bo
 
 def is_image_file(file_path: Path) -> bool:
     """Check if file is an image based on extension."""
-    image_extensions = [".png", ".jpg", ".jpeg", ".bmp", ".tiff", ".tif", ".webp"]
-    return any(str(file_path).lower().endswith(ext) for ext in image_extensions)
+    return Path(file_path).suffix.lower() in _IMAGE_EXTENSIONS
 
 def is_pdf_file(file_path: Path) -> bool:
     """Check if file is a PDF based on extension."""
-    return str(file_path).lower().endswith(".pdf")
+    return Path(file_path).suffix.lower() == ".pdf"
+
+def _link_or_copy(src: Path, dst: Path) -> None:
+    """Hardlink src to dst (no bytes copied); copy when linking isn't possible."""
+    try:
+        os.link(src, dst)
+    except OSError:
+        # Different filesystem, or links unsupported
+        shutil.copy2(src, dst)
 
 def process_pdf_pipeline(
     file_id: str,
@@ -198,7 +232,7 @@ def process_pdf_pipeline(
         List of extracted receipt data
     """
     # Get uploaded file record
-    uploaded_file = db.query(UploadedFile).filter(UploadedFile.file_id == file_id).first()
+    uploaded_file = db.execute(_UPLOADED_FILE_BY_ID, {"file_id": file_id}).scalar_one_or_none()
     if not uploaded_file:
         raise ValueError(f"File not found: {file_id}")
     
@@ -215,7 +249,7 @@ def process_pdf_pipeline(
     uploaded_file.status = "processing"
     db.commit()
     
-    pipeline_start_time = time.time()
+    pipeline_start_time = time.perf_counter()
     
     try:
         all_receipts = []
@@ -223,137 +257,73 @@ def process_pdf_pipeline(
         total_pages = 0
 
         # ---------------------------------------------------------------
-        # PDF path: langchain text extraction (primary), OCR fallback
+        # PDF path: pypdfium2 text extraction (primary), OCR fallback
         # ---------------------------------------------------------------
         if is_pdf_file(file_path):
             if progress_callback:
                 progress_callback(10, "Extracting text from PDF...")
 
             logger.info(f"Extracting text from PDF: {file_path}")
-            step_start = time.time()
+            step_start = time.perf_counter()
 
-            pages = extract_text_from_pdf_safe(file_path)
+            try:
+                with open_pdf(file_path) as pdf:
+                    pages = extract_page_texts(pdf)
+            except Exception as e:
+                logger.warning(f"PDF text extraction failed: {e}")
+                pages = None
 
             if pages:
                 total_pages = len(pages)
-                logger.info(f"Extracted text from {total_pages} page(s) in {time.time() - step_start:.2f}s")
-
-                for page in pages:
-                    page_num = page["page_number"]
-                    page_stat = {"page_number": page_num, "detected": 1, "successful": 0, "rejected": 0, "rejection_reasons": []}
-
-                    if progress_callback:
-                        base = 10 + int(((page_num - 1) / max(total_pages, 1)) * 30)
-                        progress_callback(base, f"Processing page {page_num}/{total_pages}...")
-
-                    logger.info("=" * 60)
-                    logger.info(f"PAGE {page_num}/{total_pages}")
-
-                    if page["has_text"]:
-                        ocr_text = page["text"]
-                        source_path = str(file_path)
-                        logger.info(f"  Text extracted via PDF loader ({len(ocr_text)} chars)")
-                    else:
-                        # Scanned page – fall back to image + OCR
-                        logger.info("  Insufficient selectable text, falling back to OCR")
+                logger.info(f"Extracted text from {total_pages} page(s) in {time.perf_counter() - step_start:.2f}s")
+
+                # Only pages without enough selectable text are rendered, in
+                # memory, as the batches below reach them (born-digital PDFs
+                # never rasterize). pdfium is not thread-safe, so rendering
+                # stays on this thread, on one document kept open for the
+                # whole run; OCR + LLM run in workers.
+                images_dir = settings.TEMP_DIR / f"{file_id}_images"
+
+                def page_inputs():
+                    for page in pages:
+                        page_num = page["page_number"]
+                        if page["has_text"]:
+                            logger.info(f"  Page {page_num}: text extracted via PDF loader ({len(page['text'])} chars)")
+                            yield page_num, page["text"], None, str(file_path)
+                            continue
+                        logger.info(f"  Page {page_num}: insufficient selectable text, falling back to OCR")
+                        # Single receipt per page: OCR the full page image directly.
+                        # No contour detection needed — one receipt per page by agreement.
+                        page_index = page_num - 1
                         try:
-                            images_dir = settings.TEMP_DIR / f"{file_id}_images"
-                            images_dir.mkdir(exist_ok=True)
-                            image_paths = pdf_to_images(file_path, images_dir)
-                            if page_num - 1 < len(image_paths):
-                                img_path = image_paths[page_num - 1]
-                            else:
-                                raise ValueError(f"Page {page_num} not found in rendered images")
-
-                            # Single receipt per page: OCR the full page image directly.
-                            # No contour detection needed — one receipt per page by agreement.
-                            ocr_text = run_ocr(img_path)
-                            source_path = str(img_path)
-
-                        except Exception as ocr_err:
-                            logger.error(f"  OCR fallback failed: {ocr_err}")
-                            page_stat["rejected"] += 1
-                            page_stat["rejection_reasons"].append(f"OCR fallback error: {ocr_err}")
-                            page_stats.append(page_stat)
+                            pixels = _render_scanned_page(file_path, page_index)
+                        except Exception as render_err:
+                            # Rejected on its own in _process_page; other pages go on
+                            logger.error(f"  Rendering failed on page {page_num}: {render_err}")
+                            yield page_num, None, render_err, None
                             continue
+                        yield page_num, None, pixels, str(page_image_path(file_path, images_dir, page_index))
 
-                    if not ocr_text or len(ocr_text.strip()) < 10:
-                        logger.warning(f"  Skipping page {page_num}: insufficient text ({len(ocr_text) if ocr_text else 0} chars)")
-                        page_stat["rejected"] += 1
-                        page_stat["rejection_reasons"].append("Insufficient text")
-                        page_stats.append(page_stat)
-                        continue
-
-                    receipt_result = _extract_single_receipt(
-                        ocr_text=ocr_text,
-                        source_path=source_path,
-                        file_id=file_id,
-                        receipt_number=len(all_receipts) + 1,
-                        db=db,
-                        progress_callback=progress_callback,
-                        total_pages=total_pages,
-                        current_page=page_num,
+                with open_pdf(file_path):
+                    _run_pages(
+                        page_inputs(), total_pages, file_id, db,
+                        all_receipts, page_stats, progress_callback, "OCR fallback error",
                     )
-
-                    if receipt_result:
-                        all_receipts.append(receipt_result)
-                        page_stat["successful"] += 1
-                    else:
-                        page_stat["rejected"] += 1
-                        page_stat["rejection_reasons"].append("LLM extraction failed")
-
-                    page_stats.append(page_stat)
             else:
-                # langchain extraction failed entirely – fall back to OCR for all pages
-                logger.warning("langchain PDF extraction failed, falling back to full OCR pipeline")
+                # Text extraction failed entirely – fall back to OCR for all pages
+                logger.warning("PDF text extraction failed, falling back to full OCR pipeline")
                 images_dir = settings.TEMP_DIR / f"{file_id}_images"
-                images_dir.mkdir(exist_ok=True)
+                images_dir.mkdir(parents=True, exist_ok=True)
                 image_paths = pdf_to_images(file_path, images_dir)
                 total_pages = len(image_paths)
                 if not image_paths:
                     raise ValueError("No pages extracted from PDF")
 
-                for page_idx, img_path in enumerate(image_paths):
-                    page_num = page_idx + 1
-                    page_stat = {"page_number": page_num, "detected": 1, "successful": 0, "rejected": 0, "rejection_reasons": []}
-
-                    if progress_callback:
-                        base = 10 + int((page_idx / max(total_pages, 1)) * 30)
-                        progress_callback(base, f"OCR page {page_num}/{total_pages}...")
-
-                    try:
-                        ocr_text = run_ocr(img_path)
-                    except Exception as ocr_err:
-                        logger.error(f"  OCR failed on page {page_num}: {ocr_err}")
-                        page_stat["rejected"] += 1
-                        page_stat["rejection_reasons"].append(f"OCR error: {ocr_err}")
-                        page_stats.append(page_stat)
-                        continue
-
-                    if not ocr_text or len(ocr_text.strip()) < 10:
-                        page_stat["rejected"] += 1
-                        page_stat["rejection_reasons"].append("Insufficient OCR text")
-                        page_stats.append(page_stat)
-                        continue
-
-                    receipt_result = _extract_single_receipt(
-                        ocr_text=ocr_text,
-                        source_path=str(img_path),
-                        file_id=file_id,
-                        receipt_number=len(all_receipts) + 1,
-                        db=db,
-                        progress_callback=progress_callback,
-                        total_pages=total_pages,
-                        current_page=page_num,
-                    )
-                    if receipt_result:
-                        all_receipts.append(receipt_result)
-                        page_stat["successful"] += 1
-                    else:
-                        page_stat["rejected"] += 1
-                        page_stat["rejection_reasons"].append("LLM extraction failed")
-
-                    page_stats.append(page_stat)
+                _run_pages(
+                    ((idx + 1, None, img_path, str(img_path)) for idx, img_path in enumerate(image_paths)),
+                    total_pages, file_id, db,
+                    all_receipts, page_stats, progress_callback, "OCR error",
+                )
 
         # ---------------------------------------------------------------
         # Image path: OCR the full image (no contour detection)
@@ -367,11 +337,10 @@ def process_pdf_pipeline(
             page_stat = {"page_number": 1, "detected": 1, "successful": 0, "rejected": 0, "rejection_reasons": []}
 
             images_dir = settings.TEMP_DIR / f"{file_id}_images"
-            images_dir.mkdir(exist_ok=True)
-            import shutil
+            images_dir.mkdir(parents=True, exist_ok=True)
             temp_image_path = images_dir / f"{file_id}_page_1{file_path.suffix}"
             if not temp_image_path.exists():
-                shutil.copy2(file_path, temp_image_path)
+                _link_or_copy(file_path, temp_image_path)
 
             try:
                 ocr_text = run_ocr(temp_image_path)
@@ -413,7 +382,7 @@ def process_pdf_pipeline(
         uploaded_file.status = "completed"
         db.commit()
 
-        pipeline_duration = time.time() - pipeline_start_time
+        pipeline_duration = time.perf_counter() - pipeline_start_time
 
         total_detected = sum(s["detected"] for s in page_stats)
         total_successful = sum(s["successful"] for s in page_stats)
@@ -448,6 +417,133 @@ def process_pdf_pipeline(
         db.commit()
         raise Exception(f"Pipeline error: {str(e)}")
 
+def _run_pages(
+    page_inputs,
+    total_pages: int,
+    file_id: str,
+    db: Session,
+    all_receipts: List[Dict[str, Any]],
+    page_stats: List[Dict[str, Any]],
+    progress_callback=None,
+    ocr_error_label: str = "OCR error",
+) -> None:
+    """
+    Run OCR + LLM extraction for pages concurrently and save the results.
+
+    ``page_inputs`` yields ``(page_number, text, image, source_path)`` tuples in
+    page order; ``image`` (a rendered page or an image path) is OCR'd when
+    ``text`` is None, and ``source_path`` is stored as the receipt's image_path.
+    An exception in place of ``image`` rejects that page alone (it could not
+    be rendered). Pages rendered in memory are OCR'd straight from the array;
+    their image is written to ``source_path`` by a separate writer thread,
+    so encoding never delays OCR.
+    Pages are submitted to a thread pool in batches of ``PAGE_BATCH_SIZE``.
+    The next batch is prepared (rendered) and queued while the current one
+    is being OCR'd and extracted, so the workers never wait for rendering;
+    at most two batches of rendered pages are held in memory. The work is
+    network bound (Ollama), so threads are enough. The SQLAlchemy session is not
+    thread-safe: receipts are saved on this thread, in page order, with one
+    commit per batch, which also keeps receipt numbering deterministic.
+    """
+    batch_size = max(1, settings.PAGE_BATCH_SIZE)
+    done = 0
+
+    with (
+        ThreadPoolExecutor(max_workers=max(1, settings.PAGE_CONCURRENCY)) as executor,
+        ThreadPoolExecutor(max_workers=1, thread_name_prefix="page-image") as image_writer,
+    ):
+        def submit_next_batch():
+            batch = list(islice(page_inputs, batch_size))
+            futures = {}
+            for page_num, text, image, source_path in batch:
+                futures[executor.submit(_process_page, page_num, text, image, ocr_error_label)] = page_num
+                if isinstance(image, np.ndarray):
+                    image_writer.submit(_write_page_image, page_num, image, source_path)
+            return batch, futures
+
+        next_batch = submit_next_batch()
+        while next_batch[0]:
+            batch, futures = next_batch
+            # Prefetch: render and queue the following batch before waiting
+            next_batch = submit_next_batch()
+
+            results = {}
+            for future in as_completed(futures):
+                page_num = futures[future]
+                results[page_num] = future.result()
+                done += 1
+                if progress_callback:
+                    pct = 10 + int((done / max(total_pages, 1)) * 80)
+                    progress_callback(pct, f"Processed page {page_num}/{total_pages} ({done} done)")
+
+            pending = []
+            for page_num, _, _, source_path in batch:
+                page_stat, extraction, ocr_text = results[page_num]
+                if extraction is not None:
+                    pending.append((extraction, ocr_text, source_path))
+                page_stats.append(page_stat)
+            all_receipts.extend(_save_receipts(db, file_id, pending, len(all_receipts) + 1))
+
+
+def _render_scanned_page(pdf_path: Path, page_index: int) -> np.ndarray:
+    """Render one page for OCR, as an array the caller owns."""
+    rendered = render_pdf_pages(pdf_path, [page_index])
+    try:
+        _, pixels = next(rendered)
+        # A view into the page bitmap, which is freed when the generator closes
+        return pixels.copy()
+    finally:
+        rendered.close()
+
+
+def _write_page_image(page_num: int, pixels: np.ndarray, path: str) -> None:
+    """Save a page rendered in memory as the receipt's image (image-writer thread)."""
+    try:
+        save_page_array(pixels, Path(path))
+    except Exception as save_err:
+        logger.warning(f"  Could not save page {page_num} image: {save_err}")
+
+
+def _process_page(page_num: int, text: str | None, image, ocr_error_label: str = "OCR error"):
+    """
+    OCR (if needed) and extract a single page. Runs on a worker thread and
+    does no database work.
+
+    Returns ``(page_stat, extraction_or_None, ocr_text)``.
+    """
+    page_stat = {"page_number": page_num, "detected": 1, "successful": 0, "rejected": 0, "rejection_reasons": []}
+
+    if isinstance(image, Exception):
+        page_stat["rejected"] += 1
+        page_stat["rejection_reasons"].append(f"{ocr_error_label}: {image}")
+        return page_stat, None, None
+
+    ocr_text = text
+    if ocr_text is None:
+        try:
+            # Every image here was rendered from the PDF at PDF_RENDER_DPI
+            ocr_text = run_ocr(image, dpi=settings.PDF_RENDER_DPI)
+        except Exception as ocr_err:
+            logger.error(f"  OCR failed on page {page_num}: {ocr_err}")
+            page_stat["rejected"] += 1
+            page_stat["rejection_reasons"].append(f"{ocr_error_label}: {ocr_err}")
+            return page_stat, None, None
+
+    if not ocr_text or len(ocr_text.strip()) < 10:
+        logger.warning(f"  Skipping page {page_num}: insufficient text ({len(ocr_text) if ocr_text else 0} chars)")
+        page_stat["rejected"] += 1
+        page_stat["rejection_reasons"].append("Insufficient text" if text is not None else "Insufficient OCR text")
+        return page_stat, None, ocr_text
+
+    extraction = _extract_receipt_fields(ocr_text)
+    if extraction is None:
+        page_stat["rejected"] += 1
+        page_stat["rejection_reasons"].append("LLM extraction failed")
+    else:
+        page_stat["successful"] += 1
+    return page_stat, extraction, ocr_text
+
+
 def _extract_single_receipt(
     ocr_text: str,
     source_path: str,
@@ -462,36 +558,43 @@ def _extract_single_receipt(
     Run RAG retrieval → LLM extraction → post-processing → DB save for a
     single receipt text.  Returns the receipt dict or None on failure.
     """
+    if progress_callback:
+        pct = 40 + int((current_page / max(total_pages, 1)) * 50)
+        progress_callback(pct, f"Extracting receipt {receipt_number}...")
+
+    extraction = _extract_receipt_fields(ocr_text)
+    return _save_receipts(db, file_id, [(extraction, ocr_text, source_path)], receipt_number)[0]
+
+
+def _extract_receipt_fields(ocr_text: str) -> Dict[str, Any]:
+    """
+    Run RAG retrieval → LLM extraction → post-processing for a single receipt
+    text. Touches no database state, so it is safe to call from worker threads.
+    """
     # RAG retrieval
     rag_examples_block = ""
     rag_matches = []
-    try:
-        if settings.RAG_ENABLED:
-            rag_matches = retrieve_examples(ocr_text)
+    embedding = None
+    rag_future = None
+    if settings.RAG_ENABLED:
+        if settings.RAG_SPECULATIVE_EXTRACTION:
+            # Speculative: extract without few-shot examples while retrieval
+            # runs alongside; the matches are only used for cross-validation.
+            rag_future = _get_rag_executor().submit(_retrieve_rag_matches, ocr_text)
+        else:
+            rag_matches, embedding = _retrieve_rag_matches(ocr_text)
             if rag_matches:
                 rag_examples_block = build_few_shot_block(rag_matches)
-                logger.info(
-                    f"  RAG: {len(rag_matches)} similar receipt(s) "
-                    f"(best sim={rag_matches[0]['similarity']:.2f})"
-                )
-            else:
-                logger.info("  RAG: no similar receipts found")
-    except Exception as rag_err:
-        logger.warning(f"  RAG retrieval failed (non-fatal): {rag_err}")
 
     # LLM extraction
-    if progress_callback:
-        pct = 40 + int((current_page / max(total_pages, 1)) * 50)
-        progress_callback(pct, f"Extracting receipt {receipt_number}...")
-
-    llm_start = time.time()
+    llm_start = time.perf_counter()
     llm_success = False
     try:
         extracted_fields = extract_fields_llm(ocr_text, rag_examples_block=rag_examples_block)
         llm_success = True
-        logger.info(f"  LLM extraction OK in {time.time() - llm_start:.2f}s")
+        logger.info(f"  LLM extraction OK in {time.perf_counter() - llm_start:.2f}s")
     except Exception as llm_error:
-        logger.error(f"  LLM extraction failed after {time.time() - llm_start:.2f}s: {llm_error}")
+        logger.error(f"  LLM extraction failed after {time.perf_counter() - llm_start:.2f}s: {llm_error}")
         extracted_fields = {
             "merchant_name": None, "date": None, "total_amount": None,
             "tax_amount": None, "subtotal": None, "items": [],
@@ -499,6 +602,9 @@ def _extract_single_receipt(
             "currency": None, "vat_amount": None, "vat_percentage": None,
         }
 
+    if rag_future is not None:
+        rag_matches, embedding = rag_future.result()
+
     # RAG cross-validation
     if rag_matches and llm_success:
         try:
@@ -522,9 +628,118 @@ def _extract_single_receipt(
         extracted_fields["subtotal"] = round(total - tax, 2)
 
     confidence_score = calculate_confidence_score(extracted_fields, llm_success, ocr_text)
-    extracted_fields = normalize_extracted_fields(extracted_fields)
+    normalize_extracted_fields(extracted_fields)
     missing_metadata = add_missing_field_metadata(extracted_fields, confidence_score)
 
+    return {
+        "fields": extracted_fields,
+        "llm_success": llm_success,
+        "confidence_score": confidence_score,
+        "missing_metadata": missing_metadata,
+        # Reused when indexing the receipt so its text is embedded only once
+        "embedding": embedding,
+    }
+
+def _retrieve_rag_matches(ocr_text: str):
+    """
+    Retrieve similar receipts for few-shot / cross-validation (non-fatal).
+
+    Returns ``(matches, embedding)``; the embedding of ``ocr_text`` is handed
+    back so indexing the receipt later does not compute it again.
+    """
+    embedding = None
+    try:
+        embedding = generate_embedding(ocr_text)
+        rag_matches = retrieve_examples(ocr_text, embedding=embedding)
+    except Exception as rag_err:
+        logger.warning(f"  RAG retrieval failed (non-fatal): {rag_err}")
+        return [], embedding
+    if rag_matches:
+        logger.info(
+            f"  RAG: {len(rag_matches)} similar receipt(s) "
+            f"(best sim={rag_matches[0]['similarity']:.2f})"
+        )
+    else:
+        logger.info("  RAG: no similar receipts found")
+    return rag_matches, embedding
+
+
+def _save_receipts(
+    db: Session,
+    file_id: str,
+    pending: List[tuple],
+    first_receipt_number: int,
+) -> List[Dict[str, Any]]:
+    """
+    Persist a batch of extractions in a single transaction, then index them.
+
+    ``pending`` holds ``(extraction, ocr_text, source_path)`` tuples from
+    ``_extract_receipt_fields``. Rows go through a Core executemany insert
+    rather than the ORM unit of work; every value except the ID and the
+    extraction date is already known here, so only those two are read back
+    (via RETURNING where the backend supports it) and there is no refresh.
+    """
+    if not pending:
+        return []
+
+    rows = [
+        _receipt_values(extraction, ocr_text, source_path, file_id, first_receipt_number + i)
+        for i, (extraction, ocr_text, source_path) in enumerate(pending)
+    ]
+    if db.get_bind().dialect.insert_executemany_returning_sort_by_parameter_order:
+        stmt = insert(Receipt).returning(
+            Receipt.id, Receipt.extraction_date, sort_by_parameter_order=True
+        )
+        generated = db.execute(stmt, rows).all()
+    else:
+        # e.g. MySQL: no RETURNING, read the new rows back in the same transaction
+        db.execute(insert(Receipt), rows)
+        generated = db.execute(
+            select(Receipt.id, Receipt.extraction_date)
+            .where(Receipt.file_id == file_id)
+            .order_by(Receipt.id.desc())
+            .limit(len(rows))
+        ).all()[::-1]
+    db.commit()
+
+    results = [
+        _receipt_to_dict(values, receipt_id, extraction_date)
+        for values, (receipt_id, extraction_date) in zip(rows, generated)
+    ]
+
+    for result, (extraction, _, _) in zip(results, pending):
+        logger.info(
+            f"  Receipt {result['receipt_number']} saved "
+            f"(ID: {result['id']}, confidence: {extraction['confidence_score']:.0%})"
+        )
+
+    # Vector-store indexing, one bulk upsert for the batch
+    if settings.RAG_ENABLED:
+        to_index, embeddings = [], []
+        for result, (extraction, ocr_text, _) in zip(results, pending):
+            if extraction["llm_success"]:
+                to_index.append((result["id"], ocr_text, extraction["fields"], False))
+                embeddings.append(extraction["embedding"])
+        try:
+            index_receipts_bulk(to_index, embeddings=embeddings)
+        except Exception as idx_err:
+            logger.warning(f"  Vector store indexing failed (non-fatal): {idx_err}")
+
+    return results
+
+
+def _receipt_values(
+    extraction: Dict[str, Any],
+    ocr_text: str,
+    source_path: str,
+    file_id: str,
+    receipt_number: int,
+) -> Dict[str, Any]:
+    """Build the receipts-table column values for an ``_extract_receipt_fields`` result."""
+    extracted_fields = extraction["fields"]
+    confidence_score = extraction["confidence_score"]
+    missing_metadata = extraction["missing_metadata"]
+
     # Build items JSON with metadata
     items_list = extracted_fields.get("items") or []
     if not isinstance(items_list, list):
@@ -533,20 +748,18 @@ def _extract_single_receipt(
     extraction_warnings = extracted_fields.get("_warnings", [])
     items_verified = extracted_fields.get("items_verified")
 
-    items_json = json.dumps({
+    items_payload = {
         "items": items_list,
         "_metadata": {
-            "currency": extracted_fields.get("currency"),
-            "vat_percentage": extracted_fields.get("vat_percentage_effective"),
             "missing_fields": missing_metadata,
             "items_verified": items_verified,
             "warnings": extraction_warnings,
         },
-    })
+    }
 
     vat_breakdown_json = extracted_fields.get("vat_breakdown") or None
 
-    db_receipt = Receipt(
+    return dict(
         file_id=file_id,
         receipt_number=receipt_number,
         merchant_name=extracted_fields.get("merchant_name"),
@@ -554,9 +767,11 @@ def _extract_single_receipt(
         total_amount=extracted_fields.get("total_amount"),
         tax_amount=extracted_fields.get("tax_amount"),
         subtotal=extracted_fields.get("subtotal"),
-        items=items_json,
+        items=items_payload,
         vat_breakdown=vat_breakdown_json,
         vat_percentage_effective=extracted_fields.get("vat_percentage_effective"),
+        currency=extracted_fields.get("currency"),
+        vat_percentage=extracted_fields.get("vat_percentage_effective"),
         payment_method=extracted_fields.get("payment_method"),
         address=extracted_fields.get("address"),
         phone=extracted_fields.get("phone"),
@@ -566,83 +781,74 @@ def _extract_single_receipt(
         is_credit=1 if extracted_fields.get("is_credit") else 0,
         items_verified=1 if items_verified is True else (0 if items_verified is False else None),
     )
-    db.add(db_receipt)
-    db.commit()
-    db.refresh(db_receipt)
 
-    # Vector-store indexing
-    if settings.RAG_ENABLED and llm_success:
-        try:
-            index_receipt(
-                receipt_id=db_receipt.id,
-                ocr_text=ocr_text,
-                extracted_fields=extracted_fields,
-                is_user_corrected=False,
-            )
-        except Exception as idx_err:
-            logger.warning(f"  Vector store indexing failed (non-fatal): {idx_err}")
 
-    logger.info(f"  Receipt {receipt_number} saved (ID: {db_receipt.id}, confidence: {confidence_score:.0%})")
-
-    stored = json.loads(db_receipt.items) if db_receipt.items else {}
-    meta = stored.get("_metadata", {}) if isinstance(stored, dict) else {}
-    items_out = stored.get("items", []) if isinstance(stored, dict) else (stored if isinstance(stored, list) else [])
+def _receipt_to_dict(values: Dict[str, Any], receipt_id: int, extraction_date) -> Dict[str, Any]:
+    """Build the pipeline's response dict for an inserted receipt row."""
+    meta = values["items"]["_metadata"]
 
     return {
-        "id": db_receipt.id,
-        "file_id": db_receipt.file_id,
-        "receipt_number": db_receipt.receipt_number,
-        "merchant_name": db_receipt.merchant_name,
-        "date": db_receipt.date,
-        "total_amount": db_receipt.total_amount,
-        "tax_amount": db_receipt.tax_amount,
-        "subtotal": db_receipt.subtotal,
-        "items": items_out,
-        "vat_breakdown": db_receipt.vat_breakdown or [],
-        "vat_percentage_effective": db_receipt.vat_percentage_effective,
-        "payment_method": db_receipt.payment_method,
-        "address": db_receipt.address,
-        "phone": db_receipt.phone,
-        "raw_text": db_receipt.raw_text,
-        "image_path": db_receipt.image_path,
-        "confidence_score": db_receipt.confidence_score,
-        "extraction_date": db_receipt.extraction_date,
-        "currency": meta.get("currency") or extracted_fields.get("currency"),
-        "vat_percentage": db_receipt.vat_percentage_effective,
-        "is_credit": bool(db_receipt.is_credit),
-        "items_verified": items_verified,
-        "warnings": extraction_warnings,
-        "missing_fields": meta.get("missing_fields") or missing_metadata,
+        "id": receipt_id,
+        "file_id": values["file_id"],
+        "receipt_number": values["receipt_number"],
+        "merchant_name": values["merchant_name"],
+        "date": values["date"],
+        "total_amount": values["total_amount"],
+        "tax_amount": values["tax_amount"],
+        "subtotal": values["subtotal"],
+        "items": values["items"]["items"],
+        "vat_breakdown": values["vat_breakdown"] or [],
+        "vat_percentage_effective": values["vat_percentage_effective"],
+        "payment_method": values["payment_method"],
+        "address": values["address"],
+        "phone": values["phone"],
+        "raw_text": values["raw_text"],
+        "image_path": values["image_path"],
+        "confidence_score": values["confidence_score"],
+        "extraction_date": extraction_date,
+        "currency": values["currency"],
+        "vat_percentage": values["vat_percentage_effective"],
+        "is_credit": bool(values["is_credit"]),
+        "items_verified": meta["items_verified"],
+        "warnings": meta["warnings"],
+        "missing_fields": meta["missing_fields"],
     }
 
+def _vat_kernel(total: float, tax: float, vat_pct: float | None) -> tuple[float, float]:
+    """
+    Pure arithmetic behind _compute_vat, for total > tax > 0.
+
+    Returns (vat_percentage, implied_subtotal). The LLM's vat_pct is kept
+    unless missing or more than 5 points away from the computed rate.
+    """
+    diff = total - tax
+    inclusive = (tax / diff) * 100
+    calc, subtotal = inclusive, diff
+
+    if not 5.0 <= inclusive <= 30.0:
+        exclusive = (tax / total) * 100
+        if 0.0 <= exclusive <= 15.0:
+            calc, subtotal = exclusive, total
+
+    if vat_pct is None or abs(vat_pct - calc) > 5.0:
+        vat_pct = round(calc, 1)
+    return vat_pct, round(subtotal, 2)
+
+
 def _compute_vat(extracted_fields: Dict[str, Any]) -> None:
     """Compute/validate VAT percentage from total and tax amounts in-place."""
-    if not (extracted_fields.get("total_amount") and extracted_fields.get("tax_amount")):
+    total = extracted_fields.get("total_amount")
+    tax = extracted_fields.get("tax_amount")
+    if not (total and tax):
         return
-    total = float(extracted_fields["total_amount"])
-    tax = float(extracted_fields["tax_amount"])
+    total = float(total)
+    tax = float(tax)
     if not (total > tax > 0):
         return
 
-    inclusive = (tax / (total - tax)) * 100
-    exclusive = (tax / total) * 100
-
-    if 5.0 <= inclusive <= 30.0:
-        calc = inclusive
-        if extracted_fields.get("subtotal") is None:
-            extracted_fields["subtotal"] = round(total - tax, 2)
-    elif 0.0 <= exclusive <= 15.0:
-        calc = exclusive
-        if extracted_fields.get("subtotal") is None:
-            extracted_fields["subtotal"] = round(total, 2)
-    else:
-        calc = inclusive
-        if extracted_fields.get("subtotal") is None:
-            extracted_fields["subtotal"] = round(total - tax, 2)
+    vat_pct = extracted_fields.get("vat_percentage")
+    vat_pct, subtotal = _vat_kernel(total, tax, None if vat_pct is None else float(vat_pct))
 
-    if extracted_fields.get("vat_percentage") is None:
-        extracted_fields["vat_percentage"] = round(calc, 1)
-    else:
-        llm_val = float(extracted_fields["vat_percentage"])
-        if abs(llm_val - calc) > 5.0:
-            extracted_fields["vat_percentage"] = round(calc, 1)
\ No newline at end of file
+    extracted_fields["vat_percentage"] = vat_pct
+    if extracted_fields.get("subtotal") is None:
+        extracted_fields["subtotal"] = subtotal
@@ -13,6 +13,7 @@ context-enriched prompts. When a new receipt is processed, this module:
 """
 import json
 import logging
+from collections import Counter
 from typing import Any, Dict, List, Optional, Tuple
 
 from config import settings
@@ -20,12 +21,25 @@ from services.vector_store import query_similar_receipts
 
 logger = logging.getLogger(__name__)
 
+_FEW_SHOT_HEADER = "\n".join([
+    "REFERENCE EXAMPLES",
+    "Below are real receipts that were previously processed successfully.",
+    "Use them as guidance for format, field names, and value styles — but",
+    "extract data ONLY from the new OCR text provided afterwards.",
+    "",
+])
+
 
 def retrieve_examples(
     ocr_text: str,
     exclude_receipt_ids: List[int] | None = None,
+    embedding: Optional[List[float]] = None,
 ) -> List[Dict[str, Any]]:
-    """Return similar past receipts suitable for few-shot injection."""
+    """
+    Return similar past receipts suitable for few-shot injection.
+
+    ``embedding`` is the vector for ``ocr_text`` if the caller already has it.
+    """
     if not settings.RAG_ENABLED:
         return []
 
@@ -34,7 +48,9 @@ def retrieve_examples(
         top_k=settings.RAG_TOP_K,
         min_similarity=settings.RAG_MIN_SIMILARITY,
         exclude_ids=exclude_receipt_ids,
+        embedding=embedding,
     )
+    matches = _dedupe_matches(matches)
     logger.info(
         f"RAG retrieved {len(matches)} similar receipt(s) "
         f"(similarities: {[m['similarity'] for m in matches]})"
@@ -42,6 +58,34 @@ def retrieve_examples(
     return matches
 
 
+def _dedupe_matches(matches: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Keep one match per (merchant, total) fingerprint.
+
+    Re-uploads of the same receipt come back as near-identical neighbours;
+    they only repeat an example in the prompt and count twice in
+    cross_validate's voting. ``matches`` is already ranked, so the first
+    match of each fingerprint is kept. Matches with neither field are left
+    alone since there is nothing to compare.
+    """
+    seen = set()
+    unique = []
+    for match in matches:
+        meta = match.get("metadata") or {}
+        merchant = meta.get("merchant_name")
+        total = meta.get("total_amount")
+        if merchant is not None or total is not None:
+            key = (
+                merchant.strip().lower() if isinstance(merchant, str) else merchant,
+                round(total, 2) if isinstance(total, (int, float)) else total,
+            )
+            if key in seen:
+                continue
+            seen.add(key)
+        unique.append(match)
+    return unique
+
+
 def build_few_shot_block(matches: List[Dict[str, Any]]) -> str:
     """
     Format retrieved matches into a few-shot examples block that can be
@@ -50,34 +94,13 @@ def build_few_shot_block(matches: List[Dict[str, Any]]) -> str:
     if not matches:
         return ""
 
-    parts = [
-        "REFERENCE EXAMPLES",
-        "Below are real receipts that were previously processed successfully.",
-        "Use them as guidance for format, field names, and value styles — but",
-        "extract data ONLY from the new OCR text provided afterwards.",
-        "",
-    ]
-
-    for idx, match in enumerate(matches, 1):
-        doc = match.get("document", "")
-
-        # Split into OCR portion and JSON portion
-        if "---EXTRACTED_JSON---" in doc:
-            _ocr_part, json_part = doc.split("---EXTRACTED_JSON---", 1)
-        else:
-            json_part = doc
-
-        # Only inject the extraction result (the OCR text of other receipts
-        # would just add noise and eat context window)
-        label = "user-verified" if match.get("is_user_corrected") else "auto-extracted"
-        sim = match.get("similarity", 0)
-        parts.append(f"--- Example {idx} (similarity={sim:.2f}, source={label}) ---")
-        parts.append(json_part.strip())
-        parts.append("")
-
-    parts.append("--- End of examples ---")
-    parts.append("")
-    return "\n".join(parts)
+    examples = "\n".join(
+        f"--- Example {idx} (similarity={match.get('similarity', 0):.2f}, "
+        f"source={'user-verified' if match.get('is_user_corrected') else 'auto-extracted'}) ---\n"
+        f"{_example_json(match)}\n"
+        for idx, match in enumerate(matches, 1)
+    )
+    return f"{_FEW_SHOT_HEADER}\n{examples}\n--- End of examples ---\n"
 
 
 def cross_validate(
@@ -96,8 +119,21 @@ def cross_validate(
 
     warnings: List[str] = []
 
-    neighbour_merchants = _collect_field(matches, "merchant_name")
-    neighbour_currencies = _collect_field(matches, "currency")
+    # One pass over the neighbours' metadata
+    neighbour_merchants: List[str] = []
+    neighbour_currencies: Counter = Counter()
+    neighbour_totals: List[float] = []
+    for m in matches:
+        meta = m.get("metadata") or {}
+        if v := meta.get("merchant_name"):
+            neighbour_merchants.append(str(v))
+        if v := meta.get("currency"):
+            neighbour_currencies[str(v)] += 1
+        if (v := meta.get("total_amount")) is not None:
+            try:
+                neighbour_totals.append(float(v))
+            except (ValueError, TypeError):
+                pass
 
     merchant = extracted.get("merchant_name")
     currency = extracted.get("currency")
@@ -105,7 +141,8 @@ def cross_validate(
     # Warn if merchant name is very different from all neighbours
     if merchant and neighbour_merchants:
         normalised = merchant.strip().lower()
-        if not any(normalised in nm.lower() or nm.lower() in normalised for nm in neighbour_merchants):
+        neighbour_lower = [nm.lower() for nm in neighbour_merchants]
+        if not any(normalised in nm or nm in normalised for nm in neighbour_lower):
             warnings.append(
                 f"merchant_name '{merchant}' differs from similar receipts: "
                 f"{neighbour_merchants[:3]}"
@@ -113,15 +150,13 @@ def cross_validate(
 
     # Auto-fill currency from neighbours when LLM left it null
     if not currency and neighbour_currencies:
-        from collections import Counter
-        most_common_currency = Counter(neighbour_currencies).most_common(1)[0][0]
+        most_common_currency = neighbour_currencies.most_common(1)[0][0]
         extracted["currency"] = most_common_currency
         warnings.append(f"currency inferred from similar receipts: {most_common_currency}")
 
     # Flag suspiciously large totals compared to neighbours
     total = extracted.get("total_amount")
     if total is not None:
-        neighbour_totals = _collect_numeric_field(matches, "total_amount")
         if neighbour_totals:
             avg_total = sum(neighbour_totals) / len(neighbour_totals)
             if avg_total > 0 and total > avg_total * 10:
@@ -138,26 +173,15 @@ def cross_validate(
 
 # Helpers
 
-def _collect_field(matches: List[Dict[str, Any]], field: str) -> List[str]:
-    """Pull a string metadata field from retrieved matches."""
-    values = []
-    for m in matches:
-        meta = m.get("metadata", {})
-        v = meta.get(field)
-        if v:
-            values.append(str(v))
-    return values
-
-
-def _collect_numeric_field(matches: List[Dict[str, Any]], field: str) -> List[float]:
-    """Pull a numeric metadata field from retrieved matches."""
-    values = []
-    for m in matches:
-        meta = m.get("metadata", {})
-        v = meta.get(field)
-        if v is not None:
-            try:
-                values.append(float(v))
-            except (ValueError, TypeError):
-                pass
-    return values
+def _example_json(match: Dict[str, Any]) -> str:
+    """
+    The extraction JSON of a match. Only the extraction result is injected
+    (the OCR text of other receipts would just add noise and eat context
+    window).
+    """
+    json_part = (match.get("metadata") or {}).get("extraction_json")
+    if json_part is None:
+        # Indexed before the JSON was stored in metadata: split the document
+        doc = match.get("document") or ""
+        json_part = doc.split("---EXTRACTED_JSON---", 1)[-1]
+    return json_part.strip()
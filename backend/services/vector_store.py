@@ -5,20 +5,62 @@ Stores OCR text embeddings alongside structured metadata (merchant, amounts,
 currency, etc.) so that the RAG pipeline can retrieve semantically similar
 past receipts as few-shot examples for the LLM.
 """
+import heapq
 import json
 import logging
+import threading
+import time
+from collections import OrderedDict
+from itertools import count, islice
 from typing import Any, Dict, List, Optional, Tuple
 
+import numpy as np
+
 from config import settings
-from services.embedding_service import generate_embedding
+from services.embedding_service import generate_embedding, generate_embeddings_batch
 
 logger = logging.getLogger(__name__)
 
 _collection = None
+_collection_lock = threading.Lock()
+
+# (monotonic time of last read, result) for _collection_count; writes from
+# this process reset it, other processes' writes show up within the TTL
+_count_cache: Tuple[Optional[float], int] = (None, 0)
+_COUNT_TTL_SECS = 5.0
+
+# Compact JSON for stored extractions: no indentation whitespace in Chroma or
+# in the few-shot prompt it ends up in
+_ENCODER = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False, default=str)
+_DOC_SEPARATOR = "\n\n---EXTRACTED_JSON---\n"
+
+# HNSW build parameters. Chroma only applies these when the collection is
+# created; an existing collection keeps the ones it was built with.
+_HNSW_METADATA = {"hnsw:space": "cosine", "hnsw:construction_ef": 200, "hnsw:M": 32}
+
+# Semantic query cache: entry id -> (query params, unit-norm query embedding,
+# matches). A query whose embedding has cosine >= RAG_CACHE_TAU with a cached
+# one (same params) reuses its matches instead of querying Chroma. With
+# RAG_QUANTIZE the embeddings are held as int8 (see _quantize).
+_semantic_cache: "OrderedDict[int, Tuple[tuple, np.ndarray, List[Dict[str, Any]]]]" = OrderedDict()
+_semantic_cache_lock = threading.Lock()
+_semantic_cache_ids = count()
+_semantic_matrix: Optional[Tuple[List[int], np.ndarray]] = None  # stacked embeddings, rebuilt on change
+_INT8_SCALE = 127.0
 
 
 def _get_collection():
     """Lazy-init and return the ChromaDB collection (singleton)."""
+    if _collection is not None:
+        return _collection
+    # Pipeline workers can race here on first use; concurrent PersistentClient
+    # construction on the same directory fails
+    with _collection_lock:
+        return _init_collection()
+
+
+def _init_collection():
+    """Create the ChromaDB client and collection; call with _collection_lock held."""
     global _collection
     if _collection is not None:
         return _collection
@@ -33,7 +75,11 @@ def _get_collection():
         )
         _collection = client.get_or_create_collection(
             name=settings.CHROMA_COLLECTION_NAME,
-            metadata={"hnsw:space": "cosine"},
+            metadata=_HNSW_METADATA,
+            # Embeddings always come from Ollama (embedding_service); without
+            # this Chroma attaches its default ONNX MiniLM embedder to the
+            # collection, which is never used here
+            embedding_function=None,
         )
         logger.info(
             f"ChromaDB collection '{settings.CHROMA_COLLECTION_NAME}' ready "
@@ -72,36 +118,82 @@ def index_receipt(
         If True the receipt was manually corrected by the user and should be
         treated as a high-quality example (boosted during retrieval).
     """
-    collection = _get_collection()
-    if collection is None:
-        return False
+    return index_receipts_bulk([(receipt_id, ocr_text, extracted_fields, is_user_corrected)]) == 1
 
-    embedding = generate_embedding(ocr_text)
-    if embedding is None:
-        logger.warning(f"Could not generate embedding for receipt {receipt_id}")
-        return False
 
-    # Flatten extracted_fields into ChromaDB-friendly metadata (strings/numbers/bools).
-    metadata = _build_metadata(extracted_fields, is_user_corrected)
+def index_receipts_bulk(
+    items: List[Tuple[int, str, Dict[str, Any], bool]],
+    batch_size: int | None = None,
+    embeddings: Optional[List[Optional[List[float]]]] = None,
+) -> int:
+    """
+    Add or update many receipts in the vector store.
 
-    doc_id = str(receipt_id)
+    ``items`` holds ``(receipt_id, ocr_text, extracted_fields, is_user_corrected)``
+    tuples (see index_receipt). Embeddings are generated with one batched
+    call and written with one ``collection.upsert`` per ``batch_size``
+    receipts (default RAG_INDEX_BATCH_SIZE), so a backfill pays one Chroma
+    transaction per batch instead of one per receipt.
 
-    # Store the full extraction as the document body so it can be returned
-    # as a few-shot example without a DB round-trip.
-    document = _build_document_text(ocr_text, extracted_fields)
+    ``embeddings`` optionally holds vectors already computed for the items
+    (aligned with ``items``, None where unknown); only the missing ones are
+    generated.
 
-    try:
-        collection.upsert(
-            ids=[doc_id],
-            embeddings=[embedding],
-            documents=[document],
-            metadatas=[metadata],
-        )
-        logger.debug(f"Indexed receipt {receipt_id} (corrected={is_user_corrected})")
-        return True
-    except Exception as e:
-        logger.error(f"Failed to index receipt {receipt_id}: {e}")
-        return False
+    Returns the number of receipts indexed. Cached query results these
+    receipts would change are dropped.
+    """
+    collection = _get_collection()
+    if collection is None or not items:
+        return 0
+
+    batch_size = max(1, batch_size or settings.RAG_INDEX_BATCH_SIZE)
+    if embeddings is None:
+        embeddings = generate_embeddings_batch([ocr_text for _, ocr_text, _, _ in items])
+    else:
+        missing = [i for i, vec in enumerate(embeddings) if vec is None]
+        embeddings = list(embeddings)
+        generated = generate_embeddings_batch([items[i][1] for i in missing]) if missing else []
+        for i, vec in zip(missing, generated):
+            embeddings[i] = vec
+
+    indexed = 0
+    rows = iter(zip(items, embeddings))
+    while batch := list(islice(rows, batch_size)):
+        ids, vectors, documents, metadatas = [], [], [], []
+        for (receipt_id, ocr_text, extracted_fields, is_user_corrected), embedding in batch:
+            if embedding is None:
+                logger.warning(f"Could not generate embedding for receipt {receipt_id}")
+                continue
+            ids.append(str(receipt_id))
+            vectors.append(embedding)
+            extraction_json = _build_extraction_json(extracted_fields)
+            # Store the full extraction as the document body so it can be returned
+            # as a few-shot example without a DB round-trip.
+            documents.append(_build_document_text(ocr_text, extracted_fields, extraction_json))
+            # Flatten extracted_fields into ChromaDB-friendly metadata (strings/numbers/bools).
+            # The JSON alone is also kept there so the few-shot block needs no
+            # parsing of the document.
+            metadata = _build_metadata(extracted_fields, is_user_corrected)
+            metadata["extraction_json"] = extraction_json
+            metadatas.append(metadata)
+        if not ids:
+            continue
+
+        try:
+            collection.upsert(
+                ids=ids,
+                embeddings=vectors,
+                documents=documents,
+                metadatas=metadatas,
+            )
+            indexed += len(ids)
+            _invalidate_count()
+            _semantic_cache_invalidate(ids, vectors, [m["is_user_corrected"] for m in metadatas])
+            logger.debug(f"Indexed {len(ids)} receipt(s): {', '.join(ids)}")
+        except Exception as e:
+            logger.error(f"Failed to index receipts {', '.join(ids)}: {e}")
+
+    return indexed
 
 
 def query_similar_receipts(
@@ -109,26 +201,48 @@ def query_similar_receipts(
     top_k: int | None = None,
     min_similarity: float | None = None,
     exclude_ids: List[int] | None = None,
+    fetch_documents: bool = False,
+    embedding: Optional[List[float]] = None,
 ) -> List[Dict[str, Any]]:
     """
     Find the most similar previously-processed receipts.
 
     Returns a list of dicts with keys: receipt_id, distance, similarity,
     document (the stored few-shot text), and metadata.
+
+    Documents are only pulled from Chroma when ``fetch_documents`` is set,
+    or for legacy entries whose metadata has no ``extraction_json``;
+    otherwise ``document`` is an empty string.
+
+    Pass ``embedding`` when the caller already has the (unit-norm) vector
+    for ``ocr_text`` to skip embedding it again.
+
+    Results are served from the semantic cache when a near-identical text
+    (cosine >= RAG_CACHE_TAU) was queried recently with the same arguments.
     """
     collection = _get_collection()
-    if collection is None or collection.count() == 0:
+    if collection is None:
+        return []
+    total = _collection_count(collection)
+    if total == 0:
         return []
 
-    embedding = generate_embedding(ocr_text)
+    if embedding is None:
+        embedding = generate_embedding(ocr_text)
     if embedding is None:
         return []
 
     top_k = top_k or settings.RAG_TOP_K
     min_similarity = min_similarity or settings.RAG_MIN_SIMILARITY
 
+    params = (top_k, min_similarity, tuple(sorted(exclude_ids or ())), fetch_documents)
+    query_vec = np.asarray(embedding, dtype=np.float32)
+    cached = _semantic_cache_get(params, query_vec)
+    if cached is not None:
+        return cached
+
     # Request extra results so we can filter after
-    n_results = min(top_k + len(exclude_ids or []) + 2, collection.count())
+    n_results = min(top_k + len(exclude_ids or []) + 2, total)
     if n_results == 0:
         return []
 
@@ -136,7 +250,10 @@ def query_similar_receipts(
         results = collection.query(
             query_embeddings=[embedding],
             n_results=n_results,
-            include=["documents", "metadatas", "distances"],
+            include=(
+                ["documents", "metadatas", "distances"]
+                if fetch_documents else ["metadatas", "distances"]
+            ),
         )
     except Exception as e:
         logger.error(f"ChromaDB query failed: {e}")
@@ -147,23 +264,23 @@ def query_similar_receipts(
 
     ids = results.get("ids", [[]])[0]
     distances = results.get("distances", [[]])[0]
-    documents = results.get("documents", [[]])[0]
     metadatas = results.get("metadatas", [[]])[0]
+    documents = (results.get("documents") or [[]])[0] or [""] * len(ids)
 
-    for doc_id, dist, doc, meta in zip(ids, distances, documents, metadatas):
+    # ChromaDB cosine distance: 0 = identical, 2 = opposite
+    similarities = 1.0 - np.asarray(distances, dtype=np.float64)
+    rounded = np.round(similarities, 4)
+    for pos in np.flatnonzero(similarities >= min_similarity):
+        doc_id = ids[pos]
         if doc_id in exclude_set:
             continue
 
-        # ChromaDB cosine distance: 0 = identical, 2 = opposite
-        similarity = 1.0 - dist
-        if similarity < min_similarity:
-            continue
-
+        meta = metadatas[pos]
         matches.append({
             "receipt_id": int(doc_id),
-            "distance": dist,
-            "similarity": round(similarity, 4),
-            "document": doc,
+            "distance": distances[pos],
+            "similarity": float(rounded[pos]),
+            "document": documents[pos],
             "metadata": meta,
             "is_user_corrected": meta.get("is_user_corrected", False),
         })
@@ -172,8 +289,45 @@ def query_similar_receipts(
             break
 
     # Prioritise user-corrected examples
-    matches.sort(key=lambda m: (m["is_user_corrected"], m["similarity"]), reverse=True)
-    return matches[:top_k]
+    matches = heapq.nlargest(top_k, matches, key=lambda m: (m["is_user_corrected"], m["similarity"]))
+
+    if not fetch_documents:
+        _fetch_legacy_documents(collection, matches)
+
+    _semantic_cache_put(params, query_vec, matches)
+    return matches
+
+
+def _collection_count(collection) -> int:
+    """collection.count(), reused for _COUNT_TTL_SECS."""
+    global _count_cache
+    read_at, total = _count_cache
+    if read_at is None or time.monotonic() - read_at >= _COUNT_TTL_SECS:
+        total = collection.count()
+        _count_cache = (time.monotonic(), total)
+    return total
+
+
+def _invalidate_count() -> None:
+    global _count_cache
+    _count_cache = (None, 0)
+
+
+def _fetch_legacy_documents(collection, matches: List[Dict[str, Any]]) -> None:
+    """Fill in documents for matches indexed before extraction_json existed."""
+    legacy = {
+        str(m["receipt_id"]): m for m in matches
+        if "extraction_json" not in (m["metadata"] or {})
+    }
+    if not legacy:
+        return
+    try:
+        fetched = collection.get(ids=list(legacy), include=["documents"])
+    except Exception as e:
+        logger.warning(f"ChromaDB document fetch failed: {e}")
+        return
+    for doc_id, doc in zip(fetched.get("ids", []), fetched.get("documents") or []):
+        legacy[doc_id]["document"] = doc or ""
 
 
 def get_store_stats() -> Dict[str, Any]:
@@ -194,6 +348,89 @@ def get_store_stats() -> Dict[str, Any]:
 # Internal helpers
 # ---------------------------------------------------------------------------
 
+def _quantize(vec: np.ndarray) -> np.ndarray:
+    """Scalar-quantize a unit-norm vector to int8 (components scaled by 127)."""
+    return np.round(vec * _INT8_SCALE).astype(np.int8)
+
+
+def _dequantize(vec: np.ndarray) -> np.ndarray:
+    if vec.dtype == np.int8:
+        return vec.astype(np.float32) / _INT8_SCALE
+    return vec
+
+
+def _semantic_cache_get(params: tuple, query_vec: np.ndarray) -> Optional[List[Dict[str, Any]]]:
+    """Return cached matches for a near-identical earlier query, or None."""
+    global _semantic_matrix
+    if settings.RAG_CACHE_SIZE <= 0:
+        return None
+    with _semantic_cache_lock:
+        if not _semantic_cache:
+            return None
+        if _semantic_matrix is None:
+            entry_ids = list(_semantic_cache)
+            _semantic_matrix = (entry_ids, np.stack([_semantic_cache[i][1] for i in entry_ids]))
+        entry_ids, matrix = _semantic_matrix
+
+        # Embeddings are unit-norm, so the dot product is the cosine similarity
+        sims = matrix @ query_vec
+        if matrix.dtype == np.int8:
+            sims /= _INT8_SCALE
+        for pos in np.argsort(sims)[::-1]:
+            if sims[pos] < settings.RAG_CACHE_TAU:
+                break
+            entry_id = entry_ids[pos]
+            cached_params, _, matches = _semantic_cache[entry_id]
+            if cached_params == params:
+                _semantic_cache.move_to_end(entry_id)
+                return [dict(m) for m in matches]
+    return None
+
+
+def _semantic_cache_put(params: tuple, query_vec: np.ndarray, matches: List[Dict[str, Any]]) -> None:
+    global _semantic_matrix
+    if settings.RAG_CACHE_SIZE <= 0:
+        return
+    if settings.RAG_QUANTIZE:
+        query_vec = _quantize(query_vec)
+    with _semantic_cache_lock:
+        _semantic_cache[next(_semantic_cache_ids)] = (params, query_vec, [dict(m) for m in matches])
+        while len(_semantic_cache) > settings.RAG_CACHE_SIZE:
+            _semantic_cache.popitem(last=False)
+        _semantic_matrix = None
+
+
+def _semantic_cache_invalidate(
+    doc_ids: List[str], vectors: List[List[float]], corrected: List[bool]
+) -> None:
+    """
+    Drop cached results that (re-)indexing these receipts would change.
+
+    An entry is stale if it already contains one of the receipts, or if a
+    new receipt clears its min_similarity and would rank into its top_k
+    (room left, more similar than its weakest match, or user-corrected and
+    therefore prioritised).
+    """
+    global _semantic_matrix
+    changed = {int(i) for i in doc_ids}
+    new_vecs = np.asarray(vectors, dtype=np.float32)
+    with _semantic_cache_lock:
+        stale = []
+        for entry_id, ((top_k, min_similarity, *_), query_vec, matches) in _semantic_cache.items():
+            if any(m["receipt_id"] in changed for m in matches):
+                stale.append(entry_id)
+                continue
+            weakest = min((m["similarity"] for m in matches), default=1.0) if len(matches) >= top_k else -1.0
+            for sim, is_corrected in zip(new_vecs @ _dequantize(query_vec), corrected):
+                if sim >= min_similarity and (sim > weakest or is_corrected):
+                    stale.append(entry_id)
+                    break
+        for entry_id in stale:
+            del _semantic_cache[entry_id]
+        if stale:
+            _semantic_matrix = None
+
+
 def _build_metadata(fields: Dict[str, Any], is_user_corrected: bool) -> Dict[str, Any]:
     """Flatten extraction fields into ChromaDB-compatible metadata."""
     meta: Dict[str, Any] = {
@@ -227,7 +464,18 @@ def _build_metadata(fields: Dict[str, Any], is_user_corrected: bool) -> Dict[str
     return meta
 
 
-def _build_document_text(ocr_text: str, fields: Dict[str, Any]) -> str:
+def _build_extraction_json(fields: Dict[str, Any]) -> str:
+    """Serialise the extraction result (internal keys and nulls dropped)."""
+    clean_fields = {
+        k: v for k, v in fields.items()
+        if not k.startswith("_") and v is not None
+    }
+    return _ENCODER.encode(clean_fields)
+
+
+def _build_document_text(
+    ocr_text: str, fields: Dict[str, Any], extraction_json: Optional[str] = None
+) -> str:
     """
     Build the document text stored alongside the embedding.
 
@@ -237,12 +485,7 @@ def _build_document_text(ocr_text: str, fields: Dict[str, Any]) -> str:
     # Keep a trimmed version of OCR text to stay within reasonable size
     trimmed_ocr = ocr_text.strip()[:2000]
 
-    # Build a clean extraction dict (drop internal keys)
-    clean_fields = {
-        k: v for k, v in fields.items()
-        if not k.startswith("_") and v is not None
-    }
-
-    extraction_json = json.dumps(clean_fields, indent=2, default=str)
+    if extraction_json is None:
+        extraction_json = _build_extraction_json(fields)
 
-    return f"OCR_TEXT:\n{trimmed_ocr}\n\n---EXTRACTED_JSON---\n{extraction_json}"
+    return "".join(("OCR_TEXT:\n", trimmed_ocr, _DOC_SEPARATOR, extraction_json))
@@ -0,0 +1,134 @@
+"""
+Test script for the custom column types in models/db_models.py.
+
+Round-trips values through the ORM on a scratch SQLite database and checks
+that rows written before a column switched format (inserted here with raw
+SQL) still read back correctly.
+
+Usage:
+    python test_db_types.py
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+backend_dir = Path(__file__).parent
+if str(backend_dir) not in sys.path:
+    sys.path.insert(0, str(backend_dir))
+
+# Scratch database; must be set before config is imported
+SCRATCH_DB_URL = f"sqlite:///{tempfile.mkdtemp(prefix='receipt-genie-test-')}/test.db"
+os.environ["DATABASE_URL"] = SCRATCH_DB_URL
+
+import json
+
+import cbor2
+from sqlalchemy import text
+
+from config import settings
+from database import Base, SessionLocal, engine
+from models.db_models import Receipt
+
+if settings.DATABASE_URL != SCRATCH_DB_URL:
+    # Imported after something else loaded config: never touch that database
+    raise RuntimeError("config was loaded before the scratch DATABASE_URL was set; run this script on its own")
+
+Base.metadata.create_all(bind=engine)
+
+
+def _raw_column(receipt_id: int, column: str):
+    with engine.connect() as conn:
+        return conn.execute(text(f"SELECT {column} FROM receipts WHERE id = :id"), {"id": receipt_id}).scalar()
+
+
+def _read(receipt_id: int) -> Receipt:
+    db = SessionLocal()
+    try:
+        return db.get(Receipt, receipt_id)
+    finally:
+        db.close()
+
+
+def _add(**fields) -> int:
+    db = SessionLocal()
+    try:
+        receipt = Receipt(file_id="types", receipt_number=1, **fields)
+        db.add(receipt)
+        db.commit()
+        return receipt.id
+    finally:
+        db.close()
+
+
+def test_items_cbor_roundtrip():
+    """items is stored as CBOR bytes and decoded back to the same value."""
+    payload = {"items": [{"name": "Melk", "line_total": 1.29}], "_metadata": {"warnings": ["x"]}}
+    receipt_id = _add(items=payload)
+
+    raw = _raw_column(receipt_id, "items")
+    assert isinstance(raw, bytes) and cbor2.loads(raw) == payload, raw
+    assert _read(receipt_id).items == payload
+
+    assert _read(_add(items=None)).items is None
+    print("  OK — items round-trips as CBOR")
+
+
+def test_items_legacy_json_row():
+    """Rows written as JSON text before the CBOR switch still decode."""
+    payload = {"items": [], "_metadata": {"currency": "EUR"}}
+    with engine.begin() as conn:
+        receipt_id = conn.execute(text(
+            "INSERT INTO receipts (file_id, receipt_number, items, is_credit) "
+            "VALUES ('types', 2, :items, 0) RETURNING id"
+        ), {"items": json.dumps(payload)}).scalar()
+
+    assert _read(receipt_id).items == payload
+    print("  OK — legacy JSON text row decoded")
+
+
+
+def test_raw_text_compressed_roundtrip():
+    """raw_text is stored zlib-compressed and decoded back to the same text."""
+    import zlib
+
+    ocr_text = "ALBERT HEIJN\nMelk 1.29\nCafé crème 2.49\n" * 40
+    receipt_id = _add(raw_text=ocr_text)
+
+    raw = _raw_column(receipt_id, "raw_text")
+    assert isinstance(raw, bytes) and len(raw) < len(ocr_text.encode("utf-8")), raw[:20]
+    assert zlib.decompress(raw).decode("utf-8") == ocr_text
+    assert _read(receipt_id).raw_text == ocr_text
+
+    assert _read(_add(raw_text=None)).raw_text is None
+    print("  OK — raw_text round-trips compressed")
+
+
+def test_raw_text_legacy_rows():
+    """Plain text rows (str, or UTF-8 bytes after a TEXT -> BLOB conversion) are returned as-is."""
+    with engine.begin() as conn:
+        str_id = conn.execute(text(
+            "INSERT INTO receipts (file_id, receipt_number, raw_text, is_credit) "
+            "VALUES ('types', 3, 'TOTAAL 3.78', 0) RETURNING id"
+        )).scalar()
+        bytes_id = conn.execute(text(
+            "INSERT INTO receipts (file_id, receipt_number, raw_text, is_credit) "
+            "VALUES ('types', 4, :raw_text, 0) RETURNING id"
+        ), {"raw_text": "Crème 2.49".encode("utf-8")}).scalar()
+
+    assert _read(str_id).raw_text == "TOTAAL 3.78"
+    assert _read(bytes_id).raw_text == "Crème 2.49"
+    print("  OK — legacy plain-text rows read back unchanged")
+
+
+if __name__ == "__main__":
+    failed = 0
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            print(f"\n{name}")
+            try:
+                test()
+            except Exception as e:
+                failed += 1
+                print(f"  FAILED: {e!r}")
+    sys.exit(1 if failed else 0)
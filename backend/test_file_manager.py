@@ -0,0 +1,104 @@
+"""
+Test script for utils/file_manager.py.
+
+Saves, looks up and cleans up uploads in a scratch TEMP_DIR.
+
+Usage:
+    python test_file_manager.py
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+backend_dir = Path(__file__).parent
+if str(backend_dir) not in sys.path:
+    sys.path.insert(0, str(backend_dir))
+
+# Scratch temp directory; must be set before config is imported
+SCRATCH_TEMP_DIR = Path(tempfile.mkdtemp(prefix="receipt-genie-test-"))
+os.environ["TEMP_DIR"] = str(SCRATCH_TEMP_DIR)
+
+import re
+
+from config import settings
+from utils import file_manager
+from utils.file_manager import cleanup_temp_files, generate_file_id, get_file_path, save_uploaded_file
+
+if settings.TEMP_DIR != SCRATCH_TEMP_DIR:
+    # Imported after something else loaded config: never touch that directory
+    raise RuntimeError("config was loaded before the scratch TEMP_DIR was set; run this script on its own")
+
+
+def _touch(name: str) -> Path:
+    path = SCRATCH_TEMP_DIR / name
+    path.write_bytes(b"x")
+    return path
+
+
+def test_generate_file_id():
+    """22 URL-safe characters, unique."""
+    ids = [generate_file_id() for _ in range(10_000)]
+    assert len(set(ids)) == len(ids)
+    for file_id in ids:
+        assert re.fullmatch(r"[A-Za-z0-9_-]{22}", file_id), file_id
+    print("  OK — 10000 unique 22-char URL-safe IDs")
+
+
+def test_get_file_path():
+    """Index hit, directory-scan fallback, and .part files are skipped."""
+    file_id, path = save_uploaded_file(b"%PDF-1.4", "scan.pdf")
+    assert path == SCRATCH_TEMP_DIR / f"{file_id}.pdf" and path.read_bytes() == b"%PDF-1.4"
+    assert not list(SCRATCH_TEMP_DIR.glob("*.part"))
+    assert get_file_path(file_id) == path
+
+    # Saved by another process: only the directory scan finds it
+    file_manager._FILE_INDEX.pop(file_id)
+    assert get_file_path(file_id) == path
+
+    # Upload still being written
+    other_id = generate_file_id()
+    _touch(f"{other_id}.pdf.part")
+    assert get_file_path(other_id) is None
+
+    path.unlink()
+    assert get_file_path(file_id) is None
+    print("  OK — lookups find saved uploads only")
+
+
+def test_cleanup_temp_files():
+    """Only the given ID's files are removed, even when another name shares its prefix."""
+    file_id, upload = save_uploaded_file(b"%PDF-1.4", "scan.pdf")
+    own = [upload, _touch(f"{file_id}.pdf.part"), _touch(f"{file_id}_page_1.png")]
+    images_dir = SCRATCH_TEMP_DIR / f"{file_id}_images"
+    images_dir.mkdir()
+
+    others = [
+        _touch(f"{generate_file_id()}.pdf"),
+        # Time-ordered IDs share leading characters; other names may also
+        # extend this ID without being one of its files
+        _touch(f"{file_id[:-1]}.pdf"),
+        _touch(f"{file_id}x.pdf"),
+        _touch(f"{file_id}-legacy.pdf"),
+    ]
+
+    cleanup_temp_files(file_id)
+
+    assert not any(p.exists() for p in own), [p.name for p in own if p.exists()]
+    assert all(p.exists() for p in others), [p.name for p in others if not p.exists()]
+    assert images_dir.is_dir(), "directories are left alone"
+    assert file_id not in file_manager._FILE_INDEX
+    print("  OK — only this upload's files removed")
+
+
+if __name__ == "__main__":
+    failed = 0
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            print(f"\n{name}")
+            try:
+                test()
+            except Exception as e:
+                failed += 1
+                print(f"  FAILED: {e!r}")
+    sys.exit(1 if failed else 0)
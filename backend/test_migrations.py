@@ -0,0 +1,157 @@
+"""
+Test script for the database migrations.
+
+Each test builds the receipts table as it looked before a migration in a
+scratch SQLite database, runs the migration twice (it must be safe to
+re-run from entrypoint.sh) and checks the schema and the rewritten rows.
+
+Usage:
+    python test_migrations.py
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+backend_dir = Path(__file__).parent
+if str(backend_dir) not in sys.path:
+    sys.path.insert(0, str(backend_dir))
+
+# Scratch database; must be set before config is imported
+SCRATCH_DB_URL = f"sqlite:///{tempfile.mkdtemp(prefix='receipt-genie-test-')}/test.db"
+os.environ["DATABASE_URL"] = SCRATCH_DB_URL
+
+import json
+
+from sqlalchemy import inspect, text
+
+from config import settings
+from database import engine
+
+if settings.DATABASE_URL != SCRATCH_DB_URL:
+    # Imported after something else loaded config: never touch that database
+    raise RuntimeError("config was loaded before the scratch DATABASE_URL was set; run this script on its own")
+
+
+def _create_legacy_receipts(*extra_columns: str) -> None:
+    """(Re)create a minimal pre-migration receipts table."""
+    columns = ", ".join((
+        "id INTEGER PRIMARY KEY",
+        "file_id VARCHAR(255) NOT NULL",
+        "receipt_number INTEGER NOT NULL",
+        "items TEXT",
+        "raw_text TEXT",
+    ) + extra_columns)
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS receipts"))
+        conn.execute(text(f"CREATE TABLE receipts ({columns})"))
+
+
+def _insert(**row) -> None:
+    names = ", ".join(row)
+    params = ", ".join(f":{name}" for name in row)
+    with engine.begin() as conn:
+        conn.execute(text(f"INSERT INTO receipts ({names}) VALUES ({params})"), row)
+
+
+def _column_names() -> set:
+    return {col["name"] for col in inspect(engine).get_columns("receipts")}
+
+
+def test_add_currency_columns():
+    """Columns are added and backfilled from the items JSON metadata."""
+    from migrations import add_currency_columns
+
+    _create_legacy_receipts()
+    _insert(id=1, file_id="f", receipt_number=1, items=json.dumps(
+        {"items": [], "_metadata": {"currency": "EUR", "vat_percentage": 21.0}}
+    ))
+    _insert(id=2, file_id="f", receipt_number=2, items=json.dumps({"items": [], "_metadata": {}}))
+    _insert(id=3, file_id="f", receipt_number=3, items="not json")
+
+    assert add_currency_columns.migrate()
+    assert add_currency_columns.migrate(), "second run must be a no-op"
+
+    assert {"currency", "vat_percentage"} <= _column_names()
+    with engine.connect() as conn:
+        rows = conn.execute(text("SELECT id, currency, vat_percentage FROM receipts ORDER BY id")).fetchall()
+    assert [tuple(r) for r in rows] == [(1, "EUR", 21.0), (2, None, None), (3, None, None)], rows
+    print("  OK — currency/vat_percentage added and backfilled")
+
+
+
+def test_convert_items_to_cbor():
+    """JSON text rows are re-encoded as CBOR; CBOR and invalid rows are left alone."""
+    import cbor2
+    from migrations import convert_items_to_cbor
+
+    payload = {"items": [{"name": "Brood"}], "_metadata": {}}
+    already = cbor2.dumps({"items": [], "_metadata": {"warnings": []}})
+
+    _create_legacy_receipts()
+    _insert(id=1, file_id="f", receipt_number=1, items=json.dumps(payload))
+    _insert(id=2, file_id="f", receipt_number=2, items=already)
+    _insert(id=3, file_id="f", receipt_number=3, items="{not json")
+    _insert(id=4, file_id="f", receipt_number=4, items=None)
+
+    assert convert_items_to_cbor.migrate()
+    assert convert_items_to_cbor.migrate(), "second run must be a no-op"
+
+    with engine.connect() as conn:
+        items = dict(conn.execute(text("SELECT id, items FROM receipts")).fetchall())
+    assert cbor2.loads(items[1]) == payload, items[1]
+    assert items[2] == already
+    assert items[3] == "{not json"
+    assert items[4] is None
+    print("  OK — JSON rows re-encoded as CBOR")
+
+
+
+def test_add_receipt_file_order_index():
+    """The (file_id, receipt_number) index is created once."""
+    from migrations import add_receipt_file_order_index
+
+    _create_legacy_receipts()
+    assert add_receipt_file_order_index.migrate()
+    assert add_receipt_file_order_index.migrate(), "second run must be a no-op"
+
+    indexes = {ix["name"]: ix["column_names"] for ix in inspect(engine).get_indexes("receipts")}
+    assert indexes.get(add_receipt_file_order_index.INDEX_NAME) == ["file_id", "receipt_number"], indexes
+    print("  OK — index created")
+
+
+
+def test_compress_raw_text():
+    """Plain-text rows are compressed; compressed and NULL rows are left alone."""
+    import zlib
+    from migrations import compress_raw_text
+
+    already = zlib.compress("already compressed".encode("utf-8"), 6)
+
+    _create_legacy_receipts()
+    _insert(id=1, file_id="f", receipt_number=1, raw_text="Crème 2.49\nTOTAAL 2.49")
+    _insert(id=2, file_id="f", receipt_number=2, raw_text=already)
+    _insert(id=3, file_id="f", receipt_number=3, raw_text=None)
+
+    assert compress_raw_text.migrate()
+    assert compress_raw_text.migrate(), "second run must be a no-op"
+
+    with engine.connect() as conn:
+        raw_text = dict(conn.execute(text("SELECT id, raw_text FROM receipts")).fetchall())
+    assert zlib.decompress(raw_text[1]).decode("utf-8") == "Crème 2.49\nTOTAAL 2.49"
+    assert raw_text[2] == already
+    assert raw_text[3] is None
+    print("  OK — plain-text rows compressed")
+
+
+if __name__ == "__main__":
+    failed = 0
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            print(f"\n{name}")
+            try:
+                test()
+            except Exception as e:
+                failed += 1
+                print(f"  FAILED: {e!r}")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,211 @@
+"""
+Test script for the receipt endpoints in routers/process.py.
+
+Calls the route functions directly with a session on a scratch SQLite
+database, with RAG disabled.
+
+Usage:
+    python test_receipt_routes.py
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+backend_dir = Path(__file__).parent
+if str(backend_dir) not in sys.path:
+    sys.path.insert(0, str(backend_dir))
+
+# Scratch database, no vector store; must be set before config is imported
+SCRATCH_DB_URL = f"sqlite:///{tempfile.mkdtemp(prefix='receipt-genie-test-')}/test.db"
+os.environ["DATABASE_URL"] = SCRATCH_DB_URL
+os.environ["RAG_ENABLED"] = "false"
+
+from fastapi import HTTPException
+
+from config import settings
+from database import Base, SessionLocal, engine
+from models.db_models import Receipt, UploadedFile
+from models.receipt import ReceiptUpdate
+from routers.process import get_file_stats, update_receipt
+
+if settings.DATABASE_URL != SCRATCH_DB_URL:
+    # Imported after something else loaded config: never touch that database
+    raise RuntimeError("config was loaded before the scratch DATABASE_URL was set; run this script on its own")
+
+Base.metadata.create_all(bind=engine)
+
+
+def _add_file(file_id: str, *receipts: dict) -> list:
+    """Insert an uploaded file and its receipts; returns the receipt IDs."""
+    db = SessionLocal()
+    try:
+        db.add(UploadedFile(
+            file_id=file_id,
+            original_filename=f"{file_id}.pdf",
+            file_path=f"/tmp/{file_id}.pdf",
+            file_size=1024,
+        ))
+        rows = [
+            Receipt(file_id=file_id, receipt_number=number, **fields)
+            for number, fields in enumerate(receipts, start=1)
+        ]
+        db.add_all(rows)
+        db.commit()
+        return [row.id for row in rows]
+    finally:
+        db.close()
+
+
+def test_file_stats_aggregate():
+    """Counts, average confidence and missing-field breakdown come from one query."""
+    _add_file(
+        "stats",
+        dict(merchant_name="AH", date="2024-01-02", total_amount=3.78, tax_amount=0.31,
+             currency="EUR", confidence_score=0.9),
+        dict(merchant_name=None, date="2024-01-03", total_amount=None, tax_amount=0.1,
+             currency="EUR", confidence_score=0.6),
+        dict(merchant_name=None, date=None, total_amount=1.0, tax_amount=None,
+             currency=None, confidence_score=None),
+    )
+
+    db = SessionLocal()
+    try:
+        stats = get_file_stats("stats", db)
+    finally:
+        db.close()
+
+    assert stats["receipts_extracted"] == 3
+    assert stats["receipts_detected"] == 3 and stats["pages_processed"] == 3
+    assert stats["missing_receipts_estimate"] == 0
+    # AVG() skips NULL confidence scores
+    assert stats["average_confidence"] == 0.75, stats["average_confidence"]
+    assert stats["error_breakdown"] == {
+        "no_merchant_name": 2,
+        "no_date": 1,
+        "no_total": 1,
+        "no_tax": 1,
+        "no_currency": 1,
+    }, stats["error_breakdown"]
+    assert stats["total_missing_fields"] == 5
+    assert all(type(n) is int for n in stats["error_breakdown"].values())
+    print("  OK — aggregate stats match the rows")
+
+
+def test_file_stats_no_receipts():
+    """A file without receipts reports zeros rather than NULLs."""
+    _add_file("stats-empty")
+
+    db = SessionLocal()
+    try:
+        stats = get_file_stats("stats-empty", db)
+    finally:
+        db.close()
+
+    assert stats["receipts_extracted"] == 0
+    assert stats["average_confidence"] == 0.0
+    assert stats["pages_processed"] == 1
+    assert stats["total_missing_fields"] == 0
+    assert set(stats["error_breakdown"].values()) == {0}
+    print("  OK — empty file reports zeros")
+
+
+def test_file_stats_unknown_file():
+    db = SessionLocal()
+    try:
+        get_file_stats("no-such-file", db)
+    except HTTPException as e:
+        assert e.status_code == 404
+    else:
+        raise AssertionError("expected a 404 for an unknown file")
+    finally:
+        db.close()
+    print("  OK — unknown file is a 404")
+
+
+def _update(receipt_id: int, **fields):
+    db = SessionLocal()
+    try:
+        return update_receipt(receipt_id, ReceiptUpdate(**fields), db)
+    finally:
+        db.close()
+
+
+def _read(receipt_id: int) -> Receipt:
+    db = SessionLocal()
+    try:
+        return db.get(Receipt, receipt_id)
+    finally:
+        db.close()
+
+
+def test_update_receipt_partial():
+    """Only the fields sent are written; normalization-derived keys are not."""
+    [receipt_id] = _add_file("update", dict(
+        merchant_name="AH", date="2024-01-02", total_amount=3.78, tax_amount=0.31,
+        currency="USD", vat_percentage=21.0, payment_method="PIN",
+    ))
+
+    response = _update(receipt_id, merchant_name="  Jumbo  ")
+    assert response.merchant_name == "Jumbo"
+
+    receipt = _read(receipt_id)
+    assert receipt.merchant_name == "Jumbo"
+    # normalize_extracted_fields fills in a default currency; it must not
+    # overwrite the stored one when currency was not sent
+    assert receipt.currency == "USD", receipt.currency
+    assert (receipt.date, receipt.total_amount, receipt.tax_amount) == ("2024-01-02", 3.78, 0.31)
+    assert receipt.vat_percentage == 21.0 and receipt.payment_method == "PIN"
+    print("  OK — unsent fields left untouched")
+
+
+def test_update_receipt_explicit_null():
+    """A field sent as null does not clear the stored value."""
+    [receipt_id] = _add_file("update-null", dict(merchant_name="AH", total_amount=3.78))
+
+    _update(receipt_id, total_amount=None, tax_amount=0.31)
+
+    receipt = _read(receipt_id)
+    assert receipt.total_amount == 3.78 and receipt.tax_amount == 0.31
+    assert receipt.merchant_name == "AH"
+    print("  OK — null values are ignored")
+
+
+def test_update_receipt_items():
+    """Replacing items keeps the stored metadata and is persisted."""
+    [receipt_id] = _add_file("update-items", dict(
+        merchant_name="AH", total_amount=3.78, currency="EUR",
+        items={"items": [{"name": "Melk", "line_total": 1.29}], "_metadata": {"warnings": ["w"]}},
+    ))
+    new_items = [{"name": "Brood", "line_total": 2.49}, {"name": "Kaas", "line_total": 1.29}]
+
+    response = _update(receipt_id, items=new_items)
+    assert response.warnings == ["w"]
+
+    items = _read(receipt_id).items
+    assert [item["name"] for item in items["items"]] == ["Brood", "Kaas"], items
+    assert items["_metadata"] == {"warnings": ["w"]}
+    print("  OK — items replaced, metadata kept")
+
+
+def test_update_receipt_unknown():
+    try:
+        _update(999999, merchant_name="AH")
+    except HTTPException as e:
+        assert e.status_code == 404
+    else:
+        raise AssertionError("expected a 404 for an unknown receipt")
+    print("  OK — unknown receipt is a 404")
+
+
+if __name__ == "__main__":
+    failed = 0
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            print(f"\n{name}")
+            try:
+                test()
+            except Exception as e:
+                failed += 1
+                print(f"  FAILED: {e!r}")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,139 @@
+"""
+Test script for the pipeline's batch receipt insert (_save_receipts).
+
+Runs on a scratch SQLite database with RAG disabled. Covers the RETURNING
+path SQLite takes and the select-back fallback used on backends without
+ordered executemany RETURNING (e.g. MySQL).
+
+Usage:
+    python test_save_receipts.py
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+backend_dir = Path(__file__).parent
+if str(backend_dir) not in sys.path:
+    sys.path.insert(0, str(backend_dir))
+
+# Scratch database, no vector store; must be set before config is imported
+SCRATCH_DB_URL = f"sqlite:///{tempfile.mkdtemp(prefix='receipt-genie-test-')}/test.db"
+os.environ["DATABASE_URL"] = SCRATCH_DB_URL
+os.environ["RAG_ENABLED"] = "false"
+
+from config import settings
+from database import Base, SessionLocal, engine
+from models.db_models import Receipt
+from services.pipeline import _save_receipts
+
+if settings.DATABASE_URL != SCRATCH_DB_URL:
+    # Imported after something else loaded config: never touch that database
+    raise RuntimeError("config was loaded before the scratch DATABASE_URL was set; run this script on its own")
+
+Base.metadata.create_all(bind=engine)
+
+
+def _extraction(merchant: str, total: float) -> dict:
+    """An _extract_receipt_fields-shaped result."""
+    return {
+        "fields": {
+            "merchant_name": merchant,
+            "date": "2024-01-02",
+            "total_amount": total,
+            "tax_amount": 0.31,
+            "currency": "EUR",
+            "items": [{"name": "Melk", "line_total": total}],
+            "vat_percentage_effective": 9.0,
+            "items_verified": True,
+            "_warnings": ["w"],
+        },
+        "llm_success": True,
+        "confidence_score": 0.9,
+        "missing_metadata": {},
+    }
+
+
+def _pending(file_id: str, n: int) -> list:
+    return [
+        (_extraction(f"{file_id}-merchant-{i}", 1.0 + i), f"OCR text {i}", f"/tmp/{file_id}_page_{i}.png")
+        for i in range(n)
+    ]
+
+
+def _check_saved(file_id: str, results: list, first_number: int) -> None:
+    """Returned dicts match the rows in the database, in page order."""
+    db = SessionLocal()
+    try:
+        rows = {r.id: r for r in db.query(Receipt).filter(Receipt.file_id == file_id)}
+    finally:
+        db.close()
+
+    for offset, result in enumerate(results):
+        row = rows[result["id"]]
+        assert result["receipt_number"] == row.receipt_number == first_number + offset
+        assert result["merchant_name"] == row.merchant_name == f"{file_id}-merchant-{row.receipt_number - first_number}"
+        assert result["extraction_date"] is not None
+        assert result["items"] == row.items["items"]
+        assert result["warnings"] == ["w"] and result["items_verified"] is True
+        assert row.raw_text == f"OCR text {offset}"
+        assert row.currency == "EUR" and row.vat_percentage == 9.0
+
+
+def test_save_receipts_returning():
+    """One executemany INSERT ... RETURNING; IDs and dates map back in order."""
+    assert engine.dialect.insert_executemany_returning_sort_by_parameter_order
+
+    db = SessionLocal()
+    try:
+        results = _save_receipts(db, "returning", _pending("returning", 5), 1)
+    finally:
+        db.close()
+
+    assert len(results) == 5
+    assert len({r["id"] for r in results}) == 5
+    _check_saved("returning", results, 1)
+    print("  OK — 5 receipts saved via RETURNING")
+
+
+def test_save_receipts_select_back():
+    """Without ordered RETURNING the new rows are read back by file_id."""
+    dialect = engine.dialect
+    supported = dialect.insert_executemany_returning_sort_by_parameter_order
+    dialect.insert_executemany_returning_sort_by_parameter_order = False
+    db = SessionLocal()
+    try:
+        # A second batch for the same file must not pick up the first one's rows
+        first = _save_receipts(db, "select-back", _pending("select-back", 3), 1)
+        second = _save_receipts(db, "select-back", _pending("select-back", 2), 4)
+    finally:
+        db.close()
+        dialect.insert_executemany_returning_sort_by_parameter_order = supported
+
+    assert [r["receipt_number"] for r in first + second] == [1, 2, 3, 4, 5]
+    assert len({r["id"] for r in first + second}) == 5
+    _check_saved("select-back", first, 1)
+    _check_saved("select-back", second, 4)
+    print("  OK — receipts saved via select-back fallback")
+
+
+def test_save_receipts_empty():
+    db = SessionLocal()
+    try:
+        assert _save_receipts(db, "empty", [], 1) == []
+    finally:
+        db.close()
+    print("  OK — empty batch is a no-op")
+
+
+if __name__ == "__main__":
+    failed = 0
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            print(f"\n{name}")
+            try:
+                test()
+            except Exception as e:
+                failed += 1
+                print(f"  FAILED: {e!r}")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,170 @@
+"""
+Test script for the semantic query cache in services/vector_store.py.
+
+Uses a scratch ChromaDB directory and hand-made unit vectors, so no Ollama
+is needed. Chroma queries are counted to tell cache hits from misses.
+
+Usage:
+    python test_vector_store_cache.py
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+backend_dir = Path(__file__).parent
+if str(backend_dir) not in sys.path:
+    sys.path.insert(0, str(backend_dir))
+
+# Scratch vector store; must be set before config is imported
+SCRATCH_CHROMA_DIR = Path(tempfile.mkdtemp(prefix="receipt-genie-test-")) / "vector_store"
+os.environ["CHROMA_PERSIST_DIR"] = str(SCRATCH_CHROMA_DIR)
+
+import numpy as np
+
+from config import settings
+from services import vector_store
+
+if settings.CHROMA_PERSIST_DIR != SCRATCH_CHROMA_DIR:
+    # Imported after something else loaded config: never touch that store
+    raise RuntimeError("config was loaded before the scratch CHROMA_PERSIST_DIR was set; run this script on its own")
+
+DIM = 8
+
+_collection = vector_store._get_collection()
+assert _collection is not None, "ChromaDB is not available"
+
+# Count the queries that actually reach Chroma
+_chroma_queries = 0
+_chroma_query = _collection.query
+
+
+def _counting_query(*args, **kwargs):
+    global _chroma_queries
+    _chroma_queries += 1
+    return _chroma_query(*args, **kwargs)
+
+
+_collection.query = _counting_query
+
+
+def _unit(*components: float) -> list:
+    vec = np.zeros(DIM, dtype=np.float32)
+    vec[:len(components)] = components
+    return (vec / np.linalg.norm(vec)).tolist()
+
+
+def _index(receipt_id: int, embedding: list, is_user_corrected: bool = False) -> None:
+    assert vector_store.index_receipts_bulk(
+        [(receipt_id, f"OCR text {receipt_id}", {"merchant_name": f"M{receipt_id}"}, is_user_corrected)],
+        embeddings=[embedding],
+    ) == 1
+
+
+def _query(embedding: list, top_k: int = 2) -> list:
+    matches = vector_store.query_similar_receipts("unused", top_k=top_k, embedding=embedding)
+    return [m["receipt_id"] for m in matches]
+
+
+def _reset() -> None:
+    """Empty the collection and the cache."""
+    existing = _collection.get()["ids"]
+    if existing:
+        _collection.delete(ids=existing)
+    vector_store._invalidate_count()
+    with vector_store._semantic_cache_lock:
+        vector_store._semantic_cache.clear()
+        vector_store._semantic_matrix = None
+
+
+def test_near_identical_query_hits_cache():
+    """A repeated or near-identical query is served without a Chroma query."""
+    _reset()
+    _index(1, _unit(1, 0))
+    _index(2, _unit(0, 1))
+
+    before = _chroma_queries
+    assert _query(_unit(1, 0)) == [1]
+    assert _query(_unit(1, 0)) == [1]
+    # cosine ~0.9999, above RAG_CACHE_TAU
+    assert _query(_unit(1, 0.01)) == [1]
+    assert _chroma_queries - before == 1, _chroma_queries - before
+
+    # Different arguments are a different cache entry
+    vector_store.query_similar_receipts("unused", top_k=1, embedding=_unit(1, 0))
+    assert _chroma_queries - before == 2
+    print("  OK — near-identical queries served from the cache")
+
+
+def test_unrelated_upsert_keeps_cache():
+    """A receipt below the cached query's min_similarity leaves it cached."""
+    _reset()
+    _index(1, _unit(1, 0))
+    _index(2, _unit(1, 1))
+    assert _query(_unit(1, 0)) == [1, 2]
+
+    _index(3, _unit(0, 0, 1))  # orthogonal to the cached query
+
+    before = _chroma_queries
+    assert _query(_unit(1, 0)) == [1, 2]
+    assert _chroma_queries == before
+    print("  OK — unrelated upsert keeps the entry")
+
+
+def test_reindexed_match_invalidates():
+    """Re-indexing a receipt that is in a cached result drops that result."""
+    _reset()
+    _index(1, _unit(1, 0))
+    _index(2, _unit(1, 1))
+    assert _query(_unit(1, 0)) == [1, 2]
+
+    # Same vector, new extraction (e.g. after a user correction)
+    _index(2, _unit(1, 1), is_user_corrected=True)
+
+    before = _chroma_queries
+    assert _query(_unit(1, 0)) == [2, 1], "user-corrected match is ranked first"
+    assert _chroma_queries - before == 1
+    print("  OK — cached result containing the receipt dropped")
+
+
+def test_closer_upsert_invalidates():
+    """A new receipt that would rank into a full top_k drops the cached result."""
+    _reset()
+    _index(1, _unit(1, 1))
+    _index(2, _unit(1, 0.8))
+    assert _query(_unit(1, 0)) == [2, 1]
+
+    _index(3, _unit(1, 0.1))  # more similar than both cached matches
+
+    before = _chroma_queries
+    assert _query(_unit(1, 0)) == [3, 2]
+    assert _chroma_queries - before == 1
+    print("  OK — closer new receipt invalidates the entry")
+
+
+def test_weaker_upsert_keeps_full_result():
+    """A new receipt weaker than every match of a full top_k cannot change it."""
+    _reset()
+    _index(1, _unit(1, 0))
+    _index(2, _unit(1, 0.2))
+    assert _query(_unit(1, 0)) == [1, 2]
+
+    _index(3, _unit(1, 0.9))  # above min_similarity, below both matches
+
+    before = _chroma_queries
+    assert _query(_unit(1, 0)) == [1, 2]
+    assert _chroma_queries == before
+    print("  OK — weaker new receipt keeps the entry")
+
+
+if __name__ == "__main__":
+    failed = 0
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            print(f"\n{name}")
+            try:
+                test()
+            except Exception as e:
+                failed += 1
+                print(f"  FAILED: {e!r}")
+    sys.exit(1 if failed else 0)
@@ -1,16 +1,32 @@
 """
 File management utilities.
 """
+import base64
+import os
 import uuid
 import shutil
 from pathlib import Path
 from typing import Optional
 from config import settings
 
+# file_id -> saved upload path, so lookups don't scan TEMP_DIR. Files saved by
+# an earlier process are still found through the directory-scan fallback.
+_FILE_INDEX: dict[str, Path] = {}
+
+# Suffix of uploads still being written
+_PARTIAL_SUFFIX = ".part"
+
+# Time-ordered UUIDs where available (Python 3.14+), so IDs created together
+# share a prefix and land next to each other in the file_id index
+_new_uuid = getattr(uuid, "uuid7", uuid.uuid4)
+
 
 def generate_file_id() -> str:
-    """Generate a unique file ID."""
-    return str(uuid.uuid4())
+    """
+    Generate a unique file ID: the 16 UUID bytes as unpadded URL-safe
+    base64 (22 characters instead of the 36 of the hex form).
+    """
+    return base64.urlsafe_b64encode(_new_uuid().bytes).rstrip(b"=").decode("ascii")
 
 
 def save_uploaded_file(file_content: bytes, original_filename: str) -> tuple[str, Path]:
@@ -25,24 +41,48 @@ def save_uploaded_file(file_content: bytes, original_filename: str) -> tuple[str
     filename = f"{file_id}{file_extension}"
     file_path = settings.TEMP_DIR / filename
     
-    # Write file
-    with open(file_path, "wb") as f:
-        f.write(file_content)
+    # Write to a temp name and rename into place (atomic), so a partially
+    # written upload is never visible under its final name
+    part_path = file_path.with_name(f"{filename}{_PARTIAL_SUFFIX}")
+    try:
+        with open(part_path, "wb") as f:
+            f.write(file_content)
+        os.replace(part_path, file_path)
+    except BaseException:
+        part_path.unlink(missing_ok=True)
+        raise
     
+    _FILE_INDEX[file_id] = file_path
     return file_id, file_path
 
 
 def get_file_path(file_id: str) -> Optional[Path]:
     """Get file path by file_id."""
-    # Search in temp directory
-    for file_path in settings.TEMP_DIR.glob(f"{file_id}.*"):
+    file_path = _FILE_INDEX.get(file_id)
+    if file_path is not None:
         if file_path.is_file():
             return file_path
+        del _FILE_INDEX[file_id]
+
+    # Not saved by this process (or removed): search in temp directory
+    prefix = f"{file_id}."
+    with os.scandir(settings.TEMP_DIR) as entries:
+        for entry in entries:
+            if (
+                entry.name.startswith(prefix)
+                and not entry.name.endswith(_PARTIAL_SUFFIX)
+                and entry.is_file()
+            ):
+                file_path = Path(entry.path)
+                _FILE_INDEX[file_id] = file_path
+                return file_path
     return None
 
 
 def delete_file(file_path: Path) -> bool:
     """Delete a file if it exists."""
+    if _FILE_INDEX.get(file_path.stem) == file_path:
+        del _FILE_INDEX[file_path.stem]
     try:
         if file_path.exists():
             file_path.unlink()
@@ -54,9 +94,21 @@ def delete_file(file_path: Path) -> bool:
 
 def cleanup_temp_files(file_id: str) -> None:
     """Clean up all temporary files associated with a file_id."""
-    for file_path in settings.TEMP_DIR.glob(f"{file_id}*"):
-        if file_path.is_file():
-            delete_file(file_path)
+    _FILE_INDEX.pop(file_id, None)
+    # The upload ({file_id}.pdf, .part) and files derived from it
+    # ({file_id}_...); a bare prefix match would also hit any longer name
+    # that merely starts with this ID
+    prefixes = (f"{file_id}.", f"{file_id}_")
+    with os.scandir(settings.TEMP_DIR) as entries:
+        for entry in entries:
+            if (
+                (entry.name == file_id or entry.name.startswith(prefixes))
+                and entry.is_file(follow_symlinks=False)
+            ):
+                try:
+                    os.unlink(entry.path)
+                except OSError:
+                    pass
 
 
 def ensure_export_dir() -> Path:
@@ -7,6 +7,10 @@ cd /app/backend
 python -m migrations.add_vat_columns 2>/dev/null || true
 python -m migrations.add_is_credit_column 2>/dev/null || true
 python -m migrations.add_items_verified_column 2>/dev/null || true
+python -m migrations.add_currency_columns 2>/dev/null || true
+python -m migrations.convert_items_to_cbor 2>/dev/null || true
+python -m migrations.add_receipt_file_order_index 2>/dev/null || true
+python -m migrations.compress_raw_text 2>/dev/null || true
 
 # Start nginx in background
 nginx